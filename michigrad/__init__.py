@@ -0,0 +1,4 @@
+from michigrad.backend import set_device
+from michigrad.engine import record, replay, set_precision
+
+__all__ = ["record", "replay", "set_device", "set_precision"]
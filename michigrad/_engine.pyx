@@ -0,0 +1,266 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
+"""
+Kernels del forward y backward pass de la cinta, compilados de antemano
+con Cython. Son una alternativa a los kernels de Numba de michigrad.engine
+que no necesita Numba en tiempo de ejecución ni compila nada al importar.
+También incluye RowWriter, que registra en C cada fila de una operación
+entre objetos Value escalares.
+
+Para compilarlos:
+    pip install cython
+    cythonize -i michigrad/_engine.pyx
+
+Si el módulo no está compilado, michigrad.engine usa Numba o, si tampoco
+está, Python puro.
+
+Los kernels aceptan tanto arreglos float64 como float32 (ver
+michigrad.engine.set_precision); los cálculos intermedios son en double.
+"""
+from cython cimport floating
+from libc.math cimport exp, pow, tanh
+
+# Códigos de operación. Deben coincidir con los de michigrad.engine.
+cdef enum:
+    LEAF = -1
+    ADD = 0
+    MUL = 1
+    POW = 2
+    RELU = 3
+    EXP = 4
+    TANH = 5
+    SIGMOID = 6
+    SUB = 7
+    DIV = 8
+    ADD_CONST = 9
+    MUL_CONST = 10
+    AFFINE = 11
+    MSE = 12
+    LINEAR = 13
+    LINEAR_RELU = 14
+    LINEAR_TANH = 15
+    LINEAR_SIGMOID = 16
+
+
+def forward_kernel(
+    Py_ssize_t start,
+    Py_ssize_t stop,
+    const int[:] op,
+    const int[:] a,
+    const int[:] b,
+    const int[:] c,
+    const floating[:] param,
+    floating[:] data,
+    unsigned char[:] mask,
+    const int[:] args,
+):
+    """
+    Recalcula el valor de las filas de 'start' a 'stop' (ver Tape.forward).
+    """
+    cdef Py_ssize_t i
+    for i in range(start, stop):
+        if op[i] != LEAF:
+            forward_row(i, op, a, b, c, param, data, mask, args)
+
+
+cdef inline void forward_row(
+    Py_ssize_t i,
+    const int[:] op,
+    const int[:] a,
+    const int[:] b,
+    const int[:] c,
+    const floating[:] param,
+    floating[:] data,
+    unsigned char[:] mask,
+    const int[:] args,
+) noexcept:
+    """
+    Calcula el valor de la fila 'i', que no es una hoja.
+    """
+    cdef Py_ssize_t k, n
+    cdef double x, s, d
+    cdef unsigned char bit
+    if op[i] == MSE:
+        # 'a' no es un padre sino la posición de los padres en 'args'.
+        n = b[i] // 2
+        s = 0.0
+        for k in range(a[i], a[i] + n):
+            d = data[args[k]] - data[args[k + n]]
+            s += d * d
+        data[i] = s / n
+        return
+    x = data[a[i]]
+    if op[i] == ADD:
+        data[i] = x + data[b[i]]
+    elif op[i] == MUL:
+        data[i] = x * data[b[i]]
+    elif op[i] == POW:
+        data[i] = pow(x, param[i])
+    elif op[i] == RELU:
+        data[i] = 0.0 if x < 0 else x
+        bit = 1 << (i & 7)
+        if x > 0:
+            mask[i >> 3] |= bit
+        else:
+            mask[i >> 3] &= 0xFF ^ bit
+    elif op[i] == EXP:
+        data[i] = exp(x)
+    elif op[i] == TANH:
+        data[i] = tanh(x)
+    elif op[i] == SIGMOID:
+        data[i] = 0.5 * (1.0 + tanh(0.5 * x))
+    elif op[i] == SUB:
+        data[i] = x - data[b[i]]
+    elif op[i] == DIV:
+        data[i] = x / data[b[i]]
+    elif op[i] == ADD_CONST:
+        data[i] = x + param[i]
+    elif op[i] == MUL_CONST:
+        data[i] = x * param[i]
+    elif op[i] == AFFINE:
+        data[i] = x * data[b[i]] + data[c[i]]
+    elif LINEAR <= op[i] <= LINEAR_SIGMOID:
+        s = data[c[i]] if c[i] >= 0 else 0.0
+        for k in range(<Py_ssize_t>param[i]):
+            s += data[a[i] + k] * data[b[i] + k]
+        if op[i] == LINEAR_RELU:
+            bit = 1 << (i & 7)
+            if s > 0:
+                mask[i >> 3] |= bit
+            else:
+                mask[i >> 3] &= 0xFF ^ bit
+                s = 0.0
+        elif op[i] == LINEAR_TANH:
+            s = tanh(s)
+        elif op[i] == LINEAR_SIGMOID:
+            s = 0.5 * (1.0 + tanh(0.5 * s))
+        data[i] = s
+
+
+cdef class RowWriter:
+    """
+    Escribe filas nuevas en los arreglos de una cinta float64 (ver
+    Tape.push). Guarda vistas sobre esos arreglos, así que hay que crear
+    otro si la cinta los reemplaza (al agrandarse o cambiar de precisión).
+    """
+
+    cdef int[:] op, a, b, c, depth, args
+    cdef double[:] param, data, grad
+    cdef unsigned char[:] mask
+
+    def __init__(self, tape):
+        self.op = tape.op
+        self.a = tape.a
+        self.b = tape.b
+        self.c = tape.c
+        self.depth = tape.depth
+        self.args = tape.args
+        self.param = tape.param
+        self.data = tape.data
+        self.grad = tape.grad
+        self.mask = tape.mask
+
+    def push(
+        self, Py_ssize_t i, int o, int x, int y, int z, double p, double value
+    ):
+        """
+        Escribe la fila 'i', con la operación 'o', los padres 'x', 'y' y
+        'z' y el parámetro 'p', y calcula su valor y su profundidad. Si la
+        fila es una hoja, su valor es 'value'.
+        """
+        cdef int d
+        self.op[i] = o
+        self.a[i] = x
+        self.b[i] = y
+        self.c[i] = z
+        self.param[i] = p
+        self.grad[i] = 0.0
+        if o == LEAF:
+            self.data[i] = value
+            self.depth[i] = 0
+            return
+        forward_row(
+            i, self.op, self.a, self.b, self.c, self.param, self.data,
+            self.mask, self.args,
+        )
+        d = self.depth[x]
+        if y >= 0 and self.depth[y] > d:
+            d = self.depth[y]
+        if z >= 0 and self.depth[z] > d:
+            d = self.depth[z]
+        self.depth[i] = 1 + d
+
+
+def backward_kernel(
+    const long long[:] order,
+    const int[:] op,
+    const int[:] a,
+    const int[:] b,
+    const int[:] c,
+    const floating[:] param,
+    const floating[:] data,
+    floating[:] grad,
+    const unsigned char[:] mask,
+    const int[:] args,
+):
+    """
+    Propaga el gradiente de cada fila de 'order' a sus padres
+    (ver Tape.backward).
+    """
+    cdef Py_ssize_t k, i, x, y, j, m
+    cdef double g, n, d
+    for k in range(order.shape[0]):
+        i = order[k]
+        g = grad[i]
+        x = a[i]
+        y = b[i]
+        if op[i] == ADD:
+            grad[x] += g
+            grad[y] += g
+        elif op[i] == MUL:
+            grad[x] += data[y] * g
+            grad[y] += data[x] * g
+        elif op[i] == POW:
+            n = param[i]
+            grad[x] += n * pow(data[x], n - 1) * g
+        elif op[i] == RELU:
+            if (mask[i >> 3] >> (i & 7)) & 1:
+                grad[x] += g
+        elif op[i] == EXP:
+            grad[x] += data[i] * g
+        elif op[i] == TANH:
+            grad[x] += (1 - data[i] * data[i]) * g
+        elif op[i] == SIGMOID:
+            grad[x] += data[i] * (1 - data[i]) * g
+        elif op[i] == SUB:
+            grad[x] += g
+            grad[y] -= g
+        elif op[i] == DIV:
+            grad[x] += g / data[y]
+            grad[y] -= g * data[x] / (data[y] * data[y])
+        elif op[i] == ADD_CONST:
+            grad[x] += g
+        elif op[i] == MUL_CONST:
+            grad[x] += param[i] * g
+        elif op[i] == AFFINE:
+            grad[x] += data[y] * g
+            grad[y] += data[x] * g
+            grad[c[i]] += g
+        elif LINEAR <= op[i] <= LINEAR_SIGMOID:
+            if op[i] == LINEAR_RELU:
+                if not (mask[i >> 3] >> (i & 7)) & 1:
+                    g = 0.0
+            elif op[i] == LINEAR_TANH:
+                g *= 1 - data[i] * data[i]
+            elif op[i] == LINEAR_SIGMOID:
+                g *= data[i] * (1 - data[i])
+            for j in range(<Py_ssize_t>param[i]):
+                grad[x + j] += data[y + j] * g
+                grad[y + j] += data[x + j] * g
+            if c[i] >= 0:
+                grad[c[i]] += g
+        elif op[i] == MSE:
+            m = y // 2
+            for j in range(x, x + m):
+                d = 2 * g / m * (data[args[j]] - data[args[j + m]])
+                grad[args[j]] += d
+                grad[args[j + m]] -= d
@@ -0,0 +1,77 @@
+"""
+Dispositivo en el que se calculan las multiplicaciones de matrices de las
+capas lineales: la CPU (con NumPy o Numba, ver michigrad._kernels) o una
+GPU de NVIDIA (con CuPy).
+
+La cinta, y con ella el grafo, siempre queda en la CPU: es chica y se
+recorre fila por fila. Solo las multiplicaciones de matrices, que son la
+mayor parte del trabajo cuando las capas y los lotes son grandes, se
+mandan a la GPU. 'xp' es el módulo (numpy o cupy) del dispositivo actual:
+las cuentas en la GPU se hacen a través de él.
+"""
+
+import numpy as np
+
+from michigrad import _kernels
+
+try:
+    import cupy
+except ImportError:  # CuPy es opcional: sin él solo se puede usar la CPU.
+    cupy = None
+
+xp = np
+device = "cpu"
+
+# Cantidad mínima de multiplicaciones (B * nout * nin) de una capa para que
+# convenga usar la GPU. Por debajo, copiar los datos a la GPU y lanzar el
+# kernel cuesta más que hacer la cuenta en la CPU. Es una estimación: una
+# capa de 256 x 256 con lotes de 256 entradas ronda este valor.
+CUDA_MIN_FLOPS = 1 << 24
+
+
+def set_device(name: str) -> None:
+    """
+    - El argumento 'name' es "cpu" (el valor por defecto) o "cuda".
+    - Cambia el dispositivo en el que se calculan las capas lineales. Con
+    "cuda" hace falta tener CuPy instalado.
+    """
+    global xp, device
+    assert name in ("cpu", "cuda"), "el dispositivo debe ser 'cpu' o 'cuda'"
+    assert name == "cpu" or cupy is not None, "para usar 'cuda' hace falta CuPy"
+    xp = np if name == "cpu" else cupy
+    device = name
+
+
+def _on_gpu(W: np.ndarray, x: np.ndarray) -> bool:
+    """
+    Indica si la capa de pesos 'W' y entradas 'x' se calcula en la GPU.
+    """
+    return device == "cuda" and x.shape[0] * W.size >= CUDA_MIN_FLOPS
+
+
+def linear_forward(
+    W: np.ndarray, b: np.ndarray, x: np.ndarray, out: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Igual que michigrad._kernels.linear_forward, pero en la GPU si la capa
+    es lo bastante grande. El resultado siempre vuelve a la CPU.
+    """
+    if not _on_gpu(W, x):
+        return _kernels.linear_forward(W, b, x, out)
+    result = xp.asnumpy(xp.asarray(x) @ xp.asarray(W).T + xp.asarray(b))
+    if out is None:
+        return result
+    out[...] = result
+    return out
+
+
+def linear_backward(W: np.ndarray, x: np.ndarray, dout: np.ndarray) -> tuple:
+    """
+    Igual que michigrad._kernels.linear_backward, pero en la GPU si la capa
+    es lo bastante grande. Los gradientes siempre vuelven a la CPU.
+    """
+    if not _on_gpu(W, x):
+        return _kernels.linear_backward(W, x, dout)
+    W, x, dout = xp.asarray(W), xp.asarray(x), xp.asarray(dout)
+    grads = (dout.T @ x, dout.sum(axis=0), dout @ W)
+    return tuple(xp.asnumpy(g) for g in grads)
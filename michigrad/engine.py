@@ -1,5 +1,1185 @@
 # Calcado de Micrograd (https://github.com/karpathy/micrograd/blob/master/micrograd/engine.py)
+import functools
 import math
+from typing import Self
+
+import numpy as np
+
+from michigrad import backend
+from michigrad.backend import linear_backward, linear_forward
+
+try:
+    from numba import njit
+except ImportError:  # Numba es opcional: sin él se usa el backward en Python.
+    njit = None
+
+# Códigos de operación de cada fila de la cinta. Las hojas (valores creados
+# directamente por el usuario) no tienen operación ni padres.
+LEAF = -1
+ADD = 0
+MUL = 1
+POW = 2
+RELU = 3
+EXP = 4
+TANH = 5
+SIGMOID = 6
+SUB = 7
+DIV = 8
+ADD_CONST = 9
+MUL_CONST = 10
+AFFINE = 11
+MSE = 12
+LINEAR = 13
+LINEAR_RELU = 14
+LINEAR_TANH = 15
+LINEAR_SIGMOID = 16
+
+# Las operaciones LINEAR_* son una fila LINEAR seguida de una función de
+# activación, en una única fila.
+_LINEAR_OPS = (LINEAR, LINEAR_RELU, LINEAR_TANH, LINEAR_SIGMOID)
+
+# Cantidad mínima de multiplicaciones de un bloque LINEAR para resolver su
+# backward con BLAS en lugar de con el kernel fila por fila. Por debajo, el
+# costo de llamar a NumPy supera al de recorrer las filas.
+_MATMUL_MIN = 1024
+
+# Tipos de los números que las operaciones aceptan como constantes: los de
+# Python y los escalares de NumPy (np.float32, np.int64, ...). Las
+# operaciones miran antes si el otro operando es un Value, que es el caso
+# común y se descarta más rápido que los tipos de NumPy.
+_NUMBER = (int, float, np.integer, np.floating)
+
+# Largo mínimo de un tramo de filas marcadas consecutivas para que
+# Tape.reachable busque los padres de todas juntas con NumPy, en lugar de
+# fila por fila.
+_RUN_MIN = 32
+
+
+class Tape:
+    """
+    Representa a la cinta (tape) donde se registran, en orden, todos los
+    nodos del grafo de operaciones.
+
+    En lugar de guardar un objeto por nodo, la cinta guarda cada atributo
+    en su propio arreglo de NumPy (estructura de arreglos): la fila 'i' de
+    cada arreglo describe al nodo 'i'. Los objetos Value son solamente un
+    índice a una fila de la cinta.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        """
+        - El argumento 'capacity' es la cantidad de filas que se reservan
+        inicialmente. Si se llenan, la cinta duplica su tamaño, así que
+        agregar una fila cuesta O(1) amortizado.
+
+        Cada fila tiene:
+        - 'data': el valor escalar del nodo.
+        - 'grad': el gradiente del nodo.
+        - 'op': el código de la operación que creó al nodo.
+        - 'a', 'b' y 'c': los índices de los nodos padres (-1 si no hay).
+        Solo AFFINE usa los tres.
+        - 'param': un parámetro escalar de la operación (por ejemplo, el
+        exponente de la potenciación).
+        - 'depth': la profundidad del nodo en el grafo: 0 para las hojas, y
+        uno más que la del padre más profundo para el resto.
+
+        Además, 'mask' guarda un bit por fila (8 filas por byte) que indica,
+        para las filas ReLU, si la entrada era positiva. El backward de ReLU
+        lee ese bit en lugar de volver a leer el valor de la fila.
+
+        Las operaciones con una cantidad variable de padres (MSE) guardan
+        los índices de sus padres en 'args', uno detrás de otro: en esas
+        filas, 'a' es la posición del primer padre en 'args' y 'b' es la
+        cantidad de padres.
+
+        Las filas LINEAR son el producto escalar entre dos tramos contiguos
+        de la cinta, de largo 'param', que empiezan en las filas 'a' y 'b',
+        más la fila 'c' (el sesgo, -1 si no hay). Así se representa cada
+        elemento de una multiplicación de matrices. Las filas LINEAR_RELU,
+        LINEAR_TANH y LINEAR_SIGMOID además aplican esa función de
+        activación al resultado.
+        """
+        self.n = 0
+        self.data = np.zeros(capacity, dtype=np.float64)
+        self.grad = np.zeros(capacity, dtype=np.float64)
+        self.op = np.zeros(capacity, dtype=np.int32)
+        self.a = np.zeros(capacity, dtype=np.int32)
+        self.b = np.zeros(capacity, dtype=np.int32)
+        self.c = np.zeros(capacity, dtype=np.int32)
+        self.param = np.zeros(capacity, dtype=np.float64)
+        self.depth = np.zeros(capacity, dtype=np.int32)
+        self.mask = np.zeros((capacity + 7) // 8, dtype=np.uint8)
+        self.args = np.zeros(capacity, dtype=np.int32)
+        self.nargs = 0
+
+        # Nombres de los nodos, solo para los que tienen uno. Útil para graphviz.
+        self.names = {}
+
+        # Último recorrido del backward pass calculado (ver cached_schedule).
+        self._last_schedule = None
+
+        # Vistas sobre los arreglos de la cinta con las que push registra
+        # cada fila: las de la extensión de Cython si está compilada, o si
+        # no las de _RowViews. Se vuelven a crear cuando los arreglos
+        # cambian (ver _grow y set_dtype).
+        self._writer = None
+
+    def push(
+        self,
+        data: float = 0.0,
+        op: int = LEAF,
+        a: int = -1,
+        b: int = -1,
+        param: float = 0.0,
+        c: int = -1,
+    ) -> int:
+        """
+        - Agrega una fila al final de la cinta y devuelve su índice.
+        - Si la fila es una hoja, su valor es 'data'. Si no, su valor se
+        calcula aplicando la operación 'op' a los padres 'a', 'b' y 'c'.
+        """
+        i = self.n
+        if i == len(self.data):
+            self._grow()
+        self.n = i + 1
+        writer = self._writer or self._new_writer()
+        writer.push(i, op, a, b, c, param, data)
+        return i
+
+    def _new_writer(self) -> "_RowViews":
+        """
+        Crea las vistas con las que push registra cada fila: las de la
+        extensión de Cython si está compilada y la cinta es float64, o si
+        no las de _RowViews.
+        """
+        if _RowWriter is not None and self.data.dtype == np.float64:
+            self._writer = _RowWriter(self)
+        else:
+            self._writer = _RowViews(self)
+        return self._writer
+
+    def push_args(self, op: int, parents: np.ndarray) -> int:
+        """
+        - El argumento 'parents' es un arreglo con los índices de los padres.
+        - Agrega al final de la cinta una fila cuya operación 'op' tiene una
+        cantidad variable de padres, que se guardan en 'args'. Devuelve su
+        índice.
+        """
+        parents = np.asarray(parents, dtype=np.int32)
+        start, stop = self.nargs, self.nargs + len(parents)
+        while stop > len(self.args):
+            args = np.zeros(2 * len(self.args), dtype=np.int32)
+            args[:start] = self.args[:start]
+            self.args = args
+            self._writer = None
+        self.args[start:stop] = parents
+        self.nargs = stop
+
+        self._reserve(1)
+        i = self.n
+        self.n += 1
+        self.op[i] = op
+        self.a[i] = start
+        self.b[i] = len(parents)
+        self.c[i] = -1
+        self.param[i] = 0.0
+        self.grad[i] = 0.0
+        self.data[i] = _FORWARD[op](self, i)
+        self.depth[i] = 1 + self.depth[parents].max()
+        return i
+
+    def push_leaves(self, data: np.ndarray) -> int:
+        """
+        - El argumento 'data' es un arreglo de valores.
+        - Agrega al final de la cinta una hoja por cada valor de 'data', en
+        filas consecutivas, y devuelve el índice de la primera.
+        """
+        data = np.ravel(data)
+        n = len(data)
+        self._reserve(n)
+        i = self.n
+        self.n += n
+        rows = slice(i, i + n)
+        self.op[rows] = LEAF
+        self.a[rows] = self.b[rows] = self.c[rows] = -1
+        self.param[rows] = 0.0
+        self.data[rows] = data
+        self.grad[rows] = 0.0
+        self.depth[rows] = 0
+        return i
+
+    def push_block(
+        self,
+        op: int,
+        a: np.ndarray,
+        b: np.ndarray | int = -1,
+        c: np.ndarray | int = -1,
+        param: float = 0.0,
+        data: np.ndarray | None = None,
+    ) -> int:
+        """
+        - Los argumentos 'a', 'b' y 'c' son arreglos con los padres de cada
+        fila (o un único índice, que se repite en todas).
+        - Agrega al final de la cinta una fila por cada elemento de 'a', en
+        filas consecutivas y todas con la operación 'op' y el parámetro
+        'param', y devuelve el índice de la primera.
+        - El argumento 'data' es opcional: si se pasa, es el valor de las
+        filas, ya calculado (por ejemplo, con una multiplicación de
+        matrices). Si es la vista que devolvió Tape.next_rows, no se copia.
+        Si no se pasa, se calcula con una única llamada vectorizada.
+
+        Las filas de un bloque dependen de filas anteriores, nunca entre sí,
+        así que todo el bloque se registra de una sola vez.
+        """
+        a = np.asarray(a, dtype=np.int32)
+        n = len(a)
+        self._reserve(n)
+        i = self.n
+        self.n += n
+        block = slice(i, i + n)
+        rows = np.arange(i, i + n)
+        self.op[block] = op
+        self.a[block] = a
+        self.b[block] = b
+        self.c[block] = c
+        self.param[block] = param
+        self.grad[block] = 0.0
+
+        depth = np.zeros(n, dtype=np.int32)
+        for col in (self.a, self.b, self.c):
+            k = int(param) if op in _LINEAR_OPS and col is not self.c else 1
+            # Muchas filas comparten el mismo tramo de padres (por ejemplo,
+            # la misma fila de W), así que cada tramo se recorre una vez.
+            starts, inverse = np.unique(col[block], return_inverse=True)
+            parents = starts[:, None] + np.arange(k)
+            span = np.where(parents >= 0, self.depth[parents], 0).max(axis=1)
+            depth = np.maximum(depth, span[inverse])
+        self.depth[block] = 1 + depth
+
+        if data is None:
+            data = _FORWARD_BLOCK.get(op, _FORWARD[op])(self, rows)
+        data = np.ravel(data)
+        # Las filas libres de la cinta solo se comparten con Tape.next_rows.
+        if not np.may_share_memory(data, self.data[block]):
+            self.data[block] = data
+        if op == RELU or op == LINEAR_RELU:
+            # La salida de ReLU es positiva si y solo si lo era su entrada.
+            bits = (1 << (rows & 7)).astype(np.uint8)
+            np.bitwise_and.at(self.mask, rows >> 3, ~bits)
+            np.bitwise_or.at(self.mask, rows >> 3, np.where(data > 0, bits, 0))
+        return i
+
+    def next_rows(self, n: int) -> np.ndarray:
+        """
+        - Reserva lugar para 'n' filas más y devuelve la vista de 'data'
+        donde van sus valores, para calcularlos directamente en la cinta
+        antes de registrarlas con push_block (ver Value.linear).
+        """
+        self._reserve(n)
+        return self.data[self.n : self.n + n]
+
+    def _reserve(self, n: int) -> None:
+        """
+        Agranda la cinta hasta que entren 'n' filas más.
+        """
+        while self.n + n > len(self.data):
+            self._grow()
+
+    def _grow(self) -> None:
+        """
+        Duplica la capacidad de todos los arreglos de la cinta,
+        conservando las filas ya registradas.
+        """
+        capacity = 2 * len(self.data)
+        for field in ("data", "grad", "op", "a", "b", "c", "param", "depth"):
+            old = getattr(self, field)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: self.n] = old[: self.n]
+            setattr(self, field, new)
+        mask = np.zeros((capacity + 7) // 8, dtype=np.uint8)
+        mask[: len(self.mask)] = self.mask
+        self.mask = mask
+        self._writer = None
+
+    def reset(self, n: int = 0) -> None:
+        """
+        - El argumento 'n' es la cantidad de filas que se conservan.
+        - Descarta todas las filas a partir de la fila 'n'. Los nodos que se
+        registren después reutilizan la memoria ya reservada, en lugar de
+        seguir agrandando la cinta.
+
+        En un bucle de entrenamiento, el grafo de cada iteración tiene la
+        misma forma que el de la anterior. Llamando a 'tape.reset(n)' al
+        principio de cada iteración, con el 'tape.n' de antes del primer
+        forward pass, la cinta nunca crece más allá de un grafo. Es lo que
+        hace Module.zero_grad. Los objetos Value que apuntaban a filas
+        descartadas dejan de ser válidos.
+        """
+        assert 0 <= n <= self.n, "solo se pueden descartar filas existentes"
+        # Los padres de las filas MSE descartadas son los últimos de 'args':
+        # alcanza con mirar las filas que se descartan, no toda la cinta.
+        variadic = np.flatnonzero(self.op[n : self.n] == MSE)
+        if len(variadic):
+            self.nargs = int(self.a[n + variadic[0]])
+        # Las filas libres siempre tienen gradiente cero (ver _RowViews).
+        self.grad[n : self.n] = 0.0
+        self.n = n
+        if self.names:
+            self.names = {i: name for i, name in self.names.items() if i < n}
+
+    def zero_grad(self) -> None:
+        """
+        Reinicia a cero el gradiente de todas las filas de la cinta, con una
+        única escritura sobre el arreglo en lugar de un Value a la vez.
+        """
+        self.grad.fill(0.0)
+
+    def set_dtype(self, dtype: type) -> None:
+        """
+        - El argumento 'dtype' es el tipo de punto flotante (np.float32 o
+        np.float64) con el que se guardan 'data', 'grad' y 'param'.
+        - Convierte las filas ya registradas al nuevo tipo, así que los
+        objetos Value existentes siguen siendo válidos.
+        """
+        if self.data.dtype == dtype:
+            return
+        for field in ("data", "grad", "param"):
+            setattr(self, field, getattr(self, field).astype(dtype))
+        self._writer = None
+
+    def children(self, i: int) -> tuple:
+        """
+        Devuelve los índices de los nodos padres de la fila 'i'.
+        """
+        return tuple(self.parents(np.array([i])).tolist())
+
+    def parents(self, rows: np.ndarray) -> np.ndarray:
+        """
+        - El argumento 'rows' es un arreglo de índices de filas.
+        - Devuelve los índices de los padres de todas esas filas, juntos
+        (con repetidos, si dos filas comparten un padre).
+        """
+        rows = rows[self.op[rows] != LEAF]
+        op = self.op[rows]
+        linear = np.isin(op, _LINEAR_OPS)
+        fixed = rows[(op != MSE) & ~linear]
+        parents = [np.stack((self.a[fixed], self.b[fixed], self.c[fixed]), 1).ravel()]
+        for i in rows[op == MSE]:
+            parents.append(self.args[self.a[i] : self.a[i] + self.b[i]])
+        linear = rows[linear]
+        for k in np.unique(self.param[linear]):
+            rows_k = linear[self.param[linear] == k]
+            span = np.arange(int(k))
+            parents.append((np.unique(self.a[rows_k])[:, None] + span).ravel())
+            parents.append((np.unique(self.b[rows_k])[:, None] + span).ravel())
+            parents.append(self.c[rows_k])
+        parents = np.concatenate(parents)
+        return parents[parents >= 0]
+
+    def forward(self, start: int = 0, stop: int | None = None) -> None:
+        """
+        Recalcula el valor de todas las filas desde 'start' hasta 'stop'
+        (por defecto, el final de la cinta). Útil si se modificó el valor
+        de alguna hoja. Si hay un kernel compilado (Cython o Numba), lo
+        hace el kernel; si no, se usa la tabla _FORWARD.
+        """
+        stop = self.n if stop is None else stop
+        if _forward_kernel is not None:
+            _forward_kernel(
+                start,
+                stop,
+                self.op,
+                self.a,
+                self.b,
+                self.c,
+                self.param,
+                self.data,
+                self.mask,
+                self.args,
+            )
+            return
+
+        op, data = self.op, self.data
+        for i in range(start, stop):
+            if op[i] != LEAF:
+                data[i] = _FORWARD[op[i]](self, i)
+
+    def reachable(self, root: int, size: int = 1) -> np.ndarray:
+        """
+        - El argumento 'root' es el índice de una fila de la cinta.
+        - El argumento 'size' es la cantidad de filas consecutivas, a partir
+        de 'root', desde las que se recorre el grafo (más de una si el nodo
+        es un arreglo).
+        - Devuelve los índices de esas filas y de todas las filas de las
+        que dependen, de mayor a menor.
+
+        Cada fila se agrega a la cinta después que sus padres, así que el
+        orden de la cinta ya es un orden topológico: no hace falta recorrer
+        el grafo en profundidad. Alcanza con recorrer la cinta una sola vez,
+        de 'root' hacia atrás, marcando a los padres de cada fila marcada.
+        Las filas sin marcar se saltean con bytearray.rfind, sin pasar por
+        el intérprete, y los tramos largos de filas marcadas consecutivas
+        (como los bloques de un arreglo) se marcan todos juntos con NumPy.
+        """
+        hi = root + size
+        marked = bytearray(hi)
+        marked[root:hi] = b"\x01" * size
+        view = np.frombuffer(marked, dtype=np.uint8)
+        op, a, b, c = self.op, self.a, self.b, self.c
+        lo, i = root, hi
+        while True:
+            i = marked.rfind(1, lo, i)
+            if i < 0:
+                break
+            start = max(marked.rfind(0, lo, i) + 1, lo)
+            o = int(op[i])
+            if i - start >= _RUN_MIN or o == MSE or LINEAR <= o <= LINEAR_SIGMOID:
+                # Un tramo de filas marcadas: todas se procesan de una vez.
+                parents = self.parents(np.arange(start, i + 1))
+                if len(parents):
+                    view[parents] = 1
+                    lo = min(lo, int(parents.min()))
+                i = start
+            elif o != LEAF:
+                for p in (int(a[i]), int(b[i]), int(c[i])):
+                    if p >= 0:
+                        marked[p] = 1
+                        lo = min(lo, p)
+        return lo + np.flatnonzero(view[lo:])[::-1]
+
+    def schedule(self, order: np.ndarray) -> list:
+        """
+        - El argumento 'order' es un arreglo de índices de filas, en orden
+        topológico inverso.
+        - Devuelve cómo debe recorrerse 'order' en el backward pass: una
+        lista de pares (operación, filas).
+            - Si hay un kernel compilado, la operación es None para los
+            tramos de 'order' que el kernel recorre fila por fila. Las
+            multiplicaciones de matrices grandes (bloques de filas LINEAR
+            registrados por Value.linear) quedan aparte, con su operación,
+            porque se resuelven más rápido con BLAS (ver _backward_linear).
+            - Si no, los pares agrupan a las filas con la misma profundidad
+            y la misma operación, de la más profunda a la menos profunda.
+            Las filas de un grupo no dependen entre sí, así que cada grupo
+            se resuelve con una sola llamada vectorizada de NumPy.
+        """
+        if _backward_kernel is not None:
+            return self._kernel_schedule(order)
+
+        order = order[self.op[order] != LEAF]
+        if len(order) == 0:
+            return []
+
+        op, depth = self.op[order], self.depth[order]
+        keys = np.lexsort((op, -depth))
+        order, op, depth = order[keys], op[keys], depth[keys]
+        cuts = np.flatnonzero((op[1:] != op[:-1]) | (depth[1:] != depth[:-1])) + 1
+        return list(zip(op[np.r_[0, cuts]].tolist(), np.split(order, cuts)))
+
+    def _kernel_schedule(self, order: np.ndarray) -> list:
+        """
+        Arma el recorrido de Tape.schedule cuando hay un kernel compilado.
+
+        'order' ya es un orden topológico inverso, así que se respeta: solo
+        se corta en tramos. Las filas de un mismo bloque LINEAR (la misma
+        operación y la misma profundidad) son consecutivas en 'order' y no
+        dependen entre sí; si el bloque hace al menos _MATMUL_MIN
+        multiplicaciones, va aparte. Todo lo demás lo recorre el kernel.
+        Con la GPU elegida (ver michigrad.backend), todos los bloques
+        LINEAR van aparte, para que sea linear_backward quien decida dónde
+        se calculan.
+        """
+        order = order[self.op[order] != LEAF]
+        if len(order) == 0:
+            return []
+        op, depth = self.op[order], self.depth[order]
+        matmul = np.isin(op, _LINEAR_OPS)
+        changes = (matmul[1:] != matmul[:-1]) | (
+            matmul[1:] & ((op[1:] != op[:-1]) | (depth[1:] != depth[:-1]))
+        )
+        cuts = np.flatnonzero(changes) + 1
+        schedule, pending = [], []
+        for start, rows in zip(np.r_[0, cuts], np.split(order, cuts)):
+            big = len(rows) * self.param[rows[0]] >= _MATMUL_MIN
+            if matmul[start] and (big or backend.device == "cuda"):
+                if pending:
+                    schedule.append((None, np.concatenate(pending)))
+                    pending = []
+                schedule.append((int(op[start]), rows))
+            else:
+                pending.append(rows)
+        if pending:
+            schedule.append((None, np.concatenate(pending)))
+        return schedule
+
+    def cached_schedule(self, root: int) -> list:
+        """
+        - El argumento 'root' es el índice de una fila de la cinta.
+        - Devuelve el recorrido del backward pass desde 'root' (ver
+        schedule). Si el grafo es el mismo que el del último llamado, se
+        reutiliza el recorrido de ese llamado en vez de volver a recorrer
+        el grafo.
+
+        En un bucle de entrenamiento que reinicia la cinta en cada
+        iteración (ver reset), el grafo nuevo ocupa las mismas filas y
+        tiene la misma forma que el anterior: solo cambian los valores.
+        Para saberlo alcanza con comparar la operación y los padres de las
+        filas del grafo anterior, que es mucho más barato que recorrerlo.
+        """
+        last = self._last_schedule
+        if last is not None:
+            key, lo, structure, schedule = last
+            if key == (root, _backward_kernel is None, backend.device) and all(
+                np.array_equal(x, y)
+                for x, y in zip(structure, self._structure(lo, root + 1))
+            ):
+                return schedule
+
+        order = self.reachable(root)
+        schedule = self.schedule(order)
+        lo = int(order[-1])
+        structure = [x.copy() for x in self._structure(lo, root + 1)]
+        self._last_schedule = (
+            (root, _backward_kernel is None, backend.device),
+            lo,
+            structure,
+            schedule,
+        )
+        return schedule
+
+    def _structure(self, lo: int, hi: int) -> tuple:
+        """
+        Devuelve las columnas que definen la forma del grafo entre las filas
+        'lo' y 'hi': las operaciones, los padres, los parámetros (que en las
+        filas LINEAR son el largo de los tramos) y los padres guardados en
+        'args'.
+        """
+        fields = (self.op, self.a, self.b, self.c, self.param)
+        return tuple(x[lo:hi] for x in fields) + (self.args[: self.nargs],)
+
+    def backward(self, schedule: list) -> None:
+        """
+        - El argumento 'schedule' es el recorrido devuelto por
+        Tape.schedule.
+        - Propaga el gradiente de cada fila a sus padres. Los tramos sin
+        operación los recorre el kernel compilado (Cython o Numba) fila por
+        fila; al resto de los grupos se les aplica la tabla _BACKWARD.
+        """
+        for op, rows in schedule:
+            if op is None:
+                _backward_kernel(
+                    rows,
+                    self.op,
+                    self.a,
+                    self.b,
+                    self.c,
+                    self.param,
+                    self.data,
+                    self.grad,
+                    self.mask,
+                    self.args,
+                )
+            else:
+                _BACKWARD[op](self, rows)
+
+
+# Cada operación tiene una función de forward, que calcula el valor de la
+# fila 'i' a partir de sus padres, y una de backward, que propaga el
+# gradiente de un arreglo 'i' de filas (todas con esa operación) a sus
+# padres. Son funciones de módulo, así que registrar una operación no crea
+# ninguna función nueva: la fila solo guarda su código, que indexa estas
+# tablas.
+
+
+def _forward_add(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] + t.data[t.b[i]]
+
+
+def _forward_mul(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] * t.data[t.b[i]]
+
+
+def _forward_sub(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] - t.data[t.b[i]]
+
+
+def _forward_div(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] / t.data[t.b[i]]
+
+
+def _forward_add_const(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] + t.param[i]
+
+
+def _forward_mul_const(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] * t.param[i]
+
+
+def _forward_pow(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] ** t.param[i]
+
+
+def _forward_affine(t: Tape, i: int) -> float:
+    return t.data[t.a[i]] * t.data[t.b[i]] + t.data[t.c[i]]
+
+
+def _forward_mse(t: Tape, i: int) -> float:
+    # Los padres son las predicciones seguidas de los valores esperados.
+    n = t.b[i] // 2
+    rows = t.args[t.a[i] : t.a[i] + 2 * n]
+    diff = t.data[rows[:n]] - t.data[rows[n:]]
+    return float(diff @ diff) / n
+
+
+def _forward_linear(t: Tape, i: int) -> float:
+    k, a, b = int(t.param[i]), t.a[i], t.b[i]
+    out = t.data[a : a + k] @ t.data[b : b + k]
+    if t.c[i] >= 0:
+        out += t.data[t.c[i]]
+    op = t.op[i]
+    if op == LINEAR_RELU:
+        _set_sign(t, i, out > 0)
+        return 0.0 if out < 0 else out
+    if op == LINEAR_TANH:
+        return math.tanh(out)
+    if op == LINEAR_SIGMOID:
+        return 0.5 * (1.0 + math.tanh(0.5 * out))
+    return out
+
+
+def _set_sign(t: Tape, i: int, positive: bool) -> None:
+    """
+    Guarda en el bit de la fila 'i' de 'mask' si la entrada de ReLU era positiva.
+    """
+    bit = 1 << (i & 7)
+    if positive:
+        t.mask[i >> 3] |= bit
+    else:
+        t.mask[i >> 3] &= 0xFF ^ bit
+
+
+def _forward_relu(t: Tape, i: int) -> float:
+    # Igual que _set_sign, sin la llamada: ReLU es la operación escalar
+    # más común de una red.
+    x, bit = t.data[t.a[i]], 1 << (i & 7)
+    if x > 0:
+        t.mask[i >> 3] |= bit
+        return x
+    t.mask[i >> 3] &= 0xFF ^ bit
+    return 0.0
+
+
+def _forward_exp(t: Tape, i: int) -> float:
+    return math.exp(t.data[t.a[i]])
+
+
+def _forward_tanh(t: Tape, i: int) -> float:
+    return math.tanh(t.data[t.a[i]])
+
+
+def _forward_sigmoid(t: Tape, i: int) -> float:
+    # sigmoid(x) = (1 + tanh(x / 2)) / 2. A diferencia de 1 / (1 + e^-x),
+    # no desborda cuando x es muy negativo.
+    return 0.5 * (1.0 + math.tanh(0.5 * t.data[t.a[i]]))
+
+
+def _backward_add(t: Tape, i: np.ndarray) -> None:
+    """
+    El gradiente se propaga igual a ambos padres.
+    """
+    g = t.grad[i]
+    np.add.at(t.grad, t.a[i], g)
+    np.add.at(t.grad, t.b[i], g)
+
+
+def _backward_mul(t: Tape, i: np.ndarray) -> None:
+    """
+    Ejemplo: En 6 * 5, la derivada de 6 con respecto a 5 es 6,
+    y la derivada de 5 con respecto a 6 es 5.
+    """
+    g, a, b = t.grad[i], t.a[i], t.b[i]
+    np.add.at(t.grad, a, t.data[b] * g)
+    np.add.at(t.grad, b, t.data[a] * g)
+
+
+def _backward_sub(t: Tape, i: np.ndarray) -> None:
+    """
+    El gradiente se propaga igual al minuendo y con signo opuesto
+    al sustraendo.
+    """
+    g = t.grad[i]
+    np.add.at(t.grad, t.a[i], g)
+    np.subtract.at(t.grad, t.b[i], g)
+
+
+def _backward_div(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de x / y es 1 / y con respecto a x,
+    y -x / y^2 con respecto a y.
+    """
+    g, a, b = t.grad[i], t.a[i], t.b[i]
+    np.add.at(t.grad, a, g / t.data[b])
+    np.subtract.at(t.grad, b, g * t.data[a] / (t.data[b] * t.data[b]))
+
+
+def _backward_add_const(t: Tape, i: np.ndarray) -> None:
+    """
+    La constante no tiene gradiente: pasa todo al único padre.
+    """
+    np.add.at(t.grad, t.a[i], t.grad[i])
+
+
+def _backward_mul_const(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de c * x con respecto a x es c.
+    """
+    np.add.at(t.grad, t.a[i], t.param[i] * t.grad[i])
+
+
+def _backward_pow(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de x^n es n * x^(n - 1).
+    """
+    a, n = t.a[i], t.param[i]
+    np.add.at(t.grad, a, (n * (t.data[a] ** (n - 1))) * t.grad[i])
+
+
+def _backward_linear(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada del producto escalar w . x + b es x con respecto a cada
+    elemento de w, w con respecto a cada elemento de x, y 1 con respecto
+    a b.
+
+    Si la fila además aplica una función de activación, primero se
+    multiplica el gradiente por la derivada de la activación.
+
+    Los tramos de filas consecutivas que forman una multiplicación de
+    matrices (como las que registra Value.linear) se resuelven de una vez
+    con linear_backward; el resto, fila por fila.
+    """
+    for k in np.unique(t.param[i]):
+        rows = np.sort(i[t.param[i] == k])
+        g = t.grad[rows] * _dactivation(t, rows)
+        cuts = np.flatnonzero(rows[1:] != rows[:-1] + 1) + 1
+        done = np.zeros(len(rows), dtype=bool)
+        for run in np.split(np.arange(len(rows)), cuts):
+            done[run] = _backward_matmul(t, rows[run], g[run])
+        rows, g = rows[~done], g[~done]
+        if not len(rows):
+            continue
+        span = np.arange(int(k))
+        a, b = t.a[rows, None] + span, t.b[rows, None] + span
+        np.add.at(t.grad, a, t.data[b] * g[:, None])
+        np.add.at(t.grad, b, t.data[a] * g[:, None])
+        bias = t.c[rows] >= 0
+        np.add.at(t.grad, t.c[rows][bias], g[bias])
+
+
+def _dactivation(t: Tape, rows: np.ndarray) -> np.ndarray:
+    """
+    Devuelve la derivada de la función de activación de cada una de las
+    filas 'rows', todas con la misma operación LINEAR_*, a partir de su
+    salida: 1 para ReLU si la entrada era positiva (y 0 si no),
+    1 - y^2 para tanh e y * (1 - y) para sigmoid.
+    """
+    op, y = t.op[rows[0]], t.data[rows]
+    if op == LINEAR_RELU:
+        return ((t.mask[rows >> 3] >> (rows & 7)) & 1).astype(y.dtype)
+    if op == LINEAR_TANH:
+        return 1 - y * y
+    if op == LINEAR_SIGMOID:
+        return y * (1 - y)
+    return np.ones_like(y)
+
+
+@functools.lru_cache(maxsize=64)
+def _block_index(nout: int, nb: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    - Devuelve dos arreglos (j, s) con la neurona y la entrada del lote de
+    cada fila de una capa de 'nout' salidas aplicada a 'nb' entradas, en
+    el orden en que Value.linear las agrega a la cinta.
+    - Se calculan una sola vez por forma: son de solo lectura.
+    """
+    j = np.tile(np.arange(nout, dtype=np.int32), nb)
+    s = np.repeat(np.arange(nb, dtype=np.int32), nout)
+    j.flags.writeable = s.flags.writeable = False
+    return j, s
+
+
+def _backward_matmul(t: Tape, rows: np.ndarray, g: np.ndarray) -> bool:
+    """
+    - El argumento 'rows' es un tramo de filas LINEAR consecutivas.
+    - El argumento 'g' es el gradiente de cada fila, antes de la función
+    de activación.
+    - Si el tramo es una multiplicación de matrices x @ W.T + b, con W y x
+    en filas consecutivas de la cinta, propaga su gradiente con
+    linear_backward y devuelve True. Si no, devuelve False sin hacer nada.
+    """
+    nin = int(t.param[rows[0]])
+    a, b, c = t.a[rows], t.b[rows], t.c[rows]
+    nout = int(np.argmax(b != b[0])) or len(rows)
+    nb = len(rows) // nout
+    if nb * nout != len(rows):
+        return False
+    j, s = _block_index(nout, nb)
+    bias = c[0] >= 0
+    if not (
+        np.array_equal(a, a[0] + nin * j)
+        and np.array_equal(b, b[0] + nin * s)
+        and np.array_equal(c, c[0] + j if bias else c)
+    ):
+        return False
+
+    W = t.data[a[0] : a[0] + nout * nin].reshape(nout, nin)
+    x = t.data[b[0] : b[0] + nb * nin].reshape(nb, nin)
+    dW, db, dx = linear_backward(W, x, g.reshape(nb, nout))
+    t.grad[a[0] : a[0] + nout * nin] += dW.ravel()
+    t.grad[b[0] : b[0] + nb * nin] += dx.ravel()
+    if bias:
+        t.grad[c[0] : c[0] + nout] += db
+    return True
+
+
+def _backward_affine(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de w * x + b es x con respecto a w, w con respecto a x,
+    y 1 con respecto a b.
+    """
+    g, a, b = t.grad[i], t.a[i], t.b[i]
+    np.add.at(t.grad, a, t.data[b] * g)
+    np.add.at(t.grad, b, t.data[a] * g)
+    np.add.at(t.grad, t.c[i], g)
+
+
+def _backward_mse(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de mean((p - y)^2) es 2 * (p - y) / n con respecto a cada
+    predicción p, y la opuesta con respecto a cada valor esperado y.
+    """
+    for row in i:
+        n = t.b[row] // 2
+        rows = t.args[t.a[row] : t.a[row] + 2 * n]
+        g = 2 * t.grad[row] / n * (t.data[rows[:n]] - t.data[rows[n:]])
+        np.add.at(t.grad, rows[:n], g)
+        np.subtract.at(t.grad, rows[n:], g)
+
+
+def _backward_relu(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de ReLU es 1 si x > 0, y 0 en caso contrario.
+    Si x > 0 quedó guardado en el bit de la fila durante el forward pass.
+    """
+    positive = (t.mask[i >> 3] >> (i & 7)) & 1
+    np.add.at(t.grad, t.a[i], positive * t.grad[i])
+
+
+def _backward_exp(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de e^x es e^x.
+    """
+    np.add.at(t.grad, t.a[i], t.data[i] * t.grad[i])
+
+
+def _backward_tanh(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de tanh(x) es 1 - tanh^2(x).
+    """
+    y = t.data[i]
+    np.add.at(t.grad, t.a[i], (1 - y * y) * t.grad[i])
+
+
+def _backward_sigmoid(t: Tape, i: np.ndarray) -> None:
+    """
+    La derivada de sigmoid(x) es sigmoid(x) * (1 - sigmoid(x)).
+    """
+    s = t.data[i]
+    np.add.at(t.grad, t.a[i], (s * (1 - s)) * t.grad[i])
+
+
+_FORWARD = (
+    _forward_add,
+    _forward_mul,
+    _forward_pow,
+    _forward_relu,
+    _forward_exp,
+    _forward_tanh,
+    _forward_sigmoid,
+    _forward_sub,
+    _forward_div,
+    _forward_add_const,
+    _forward_mul_const,
+    _forward_affine,
+    _forward_mse,
+    _forward_linear,
+    _forward_linear,
+    _forward_linear,
+    _forward_linear,
+)
+
+
+# Versiones vectorizadas (sobre un arreglo 'i' de filas) de los forwards que
+# no sirven tal cual para arreglos. Las usa Tape.push_block.
+def _forward_relu_block(t: Tape, i: np.ndarray) -> np.ndarray:
+    # Tape.push_block guarda los bits de 'mask' a partir del resultado.
+    return np.maximum(t.data[t.a[i]], 0.0)
+
+
+def _forward_exp_block(t: Tape, i: np.ndarray) -> np.ndarray:
+    return np.exp(t.data[t.a[i]])
+
+
+def _forward_tanh_block(t: Tape, i: np.ndarray) -> np.ndarray:
+    return np.tanh(t.data[t.a[i]])
+
+
+def _forward_sigmoid_block(t: Tape, i: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * t.data[t.a[i]]))
+
+
+_FORWARD_BLOCK = {
+    RELU: _forward_relu_block,
+    EXP: _forward_exp_block,
+    TANH: _forward_tanh_block,
+    SIGMOID: _forward_sigmoid_block,
+}
+
+_BACKWARD = (
+    _backward_add,
+    _backward_mul,
+    _backward_pow,
+    _backward_relu,
+    _backward_exp,
+    _backward_tanh,
+    _backward_sigmoid,
+    _backward_sub,
+    _backward_div,
+    _backward_add_const,
+    _backward_mul_const,
+    _backward_affine,
+    _backward_mse,
+    _backward_linear,
+    _backward_linear,
+    _backward_linear,
+    _backward_linear,
+)
+
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _forward_kernel(start, stop, op, a, b, c, param, data, mask, args):
+        """
+        Misma lógica que la tabla _FORWARD, pero compilada por Numba.
+        """
+        for i in range(start, stop):
+            o = op[i]
+            if o == LEAF:
+                continue
+            if o == MSE:
+                # 'a' no es un padre sino la posición de los padres en 'args'.
+                n = b[i] // 2
+                s = 0.0
+                for k in range(a[i], a[i] + n):
+                    d = data[args[k]] - data[args[k + n]]
+                    s += d * d
+                data[i] = s / n
+                continue
+            x = data[a[i]]
+            if o == ADD:
+                data[i] = x + data[b[i]]
+            elif o == MUL:
+                data[i] = x * data[b[i]]
+            elif o == POW:
+                data[i] = x ** param[i]
+            elif o == RELU:
+                data[i] = 0.0 if x < 0 else x
+                bit = 1 << (i & 7)
+                if x > 0:
+                    mask[i >> 3] |= bit
+                else:
+                    mask[i >> 3] &= 0xFF ^ bit
+            elif o == EXP:
+                data[i] = math.exp(x)
+            elif o == TANH:
+                data[i] = math.tanh(x)
+            elif o == SIGMOID:
+                data[i] = 0.5 * (1.0 + math.tanh(0.5 * x))
+            elif o == SUB:
+                data[i] = x - data[b[i]]
+            elif o == DIV:
+                data[i] = x / data[b[i]]
+            elif o == ADD_CONST:
+                data[i] = x + param[i]
+            elif o == MUL_CONST:
+                data[i] = x * param[i]
+            elif o == AFFINE:
+                data[i] = x * data[b[i]] + data[c[i]]
+            elif LINEAR <= o <= LINEAR_SIGMOID:
+                s = data[c[i]] if c[i] >= 0 else 0.0
+                for k in range(int(param[i])):
+                    s += data[a[i] + k] * data[b[i] + k]
+                if o == LINEAR_RELU:
+                    bit = 1 << (i & 7)
+                    if s > 0:
+                        mask[i >> 3] |= bit
+                    else:
+                        mask[i >> 3] &= 0xFF ^ bit
+                        s = 0.0
+                elif o == LINEAR_TANH:
+                    s = math.tanh(s)
+                elif o == LINEAR_SIGMOID:
+                    s = 0.5 * (1.0 + math.tanh(0.5 * s))
+                data[i] = s
+
+    @njit(cache=True)
+    def _backward_kernel(order, op, a, b, c, param, data, grad, mask, args):
+        """
+        Misma lógica que la tabla _BACKWARD, pero compilada por Numba
+        sobre los arreglos de la cinta, sin pasar por el intérprete.
+        """
+        for i in order:
+            o = op[i]
+            g = grad[i]
+            x = a[i]
+            if o == ADD:
+                grad[x] += g
+                grad[b[i]] += g
+            elif o == MUL:
+                y = b[i]
+                grad[x] += data[y] * g
+                grad[y] += data[x] * g
+            elif o == POW:
+                n = param[i]
+                grad[x] += n * data[x] ** (n - 1) * g
+            elif o == RELU:
+                if (mask[i >> 3] >> (i & 7)) & 1:
+                    grad[x] += g
+            elif o == EXP:
+                grad[x] += data[i] * g
+            elif o == TANH:
+                grad[x] += (1 - data[i] * data[i]) * g
+            elif o == SIGMOID:
+                grad[x] += data[i] * (1 - data[i]) * g
+            elif o == SUB:
+                grad[x] += g
+                grad[b[i]] -= g
+            elif o == DIV:
+                y = b[i]
+                grad[x] += g / data[y]
+                grad[y] -= g * data[x] / (data[y] * data[y])
+            elif o == ADD_CONST:
+                grad[x] += g
+            elif o == MUL_CONST:
+                grad[x] += param[i] * g
+            elif o == AFFINE:
+                y = b[i]
+                grad[x] += data[y] * g
+                grad[y] += data[x] * g
+                grad[c[i]] += g
+            elif LINEAR <= o <= LINEAR_SIGMOID:
+                if o == LINEAR_RELU:
+                    if not (mask[i >> 3] >> (i & 7)) & 1:
+                        g = 0.0
+                elif o == LINEAR_TANH:
+                    g *= 1 - data[i] * data[i]
+                elif o == LINEAR_SIGMOID:
+                    g *= data[i] * (1 - data[i])
+                y = b[i]
+                for k in range(int(param[i])):
+                    grad[x + k] += data[y + k] * g
+                    grad[y + k] += data[x + k] * g
+                if c[i] >= 0:
+                    grad[c[i]] += g
+            elif o == MSE:
+                n = b[i] // 2
+                for k in range(x, x + n):
+                    d = 2 * g / n * (data[args[k]] - data[args[k + n]])
+                    grad[args[k]] += d
+                    grad[args[k + n]] -= d
+
+else:
+    _forward_kernel = None
+    _backward_kernel = None
+
+# Si se compiló la extensión de Cython (michigrad/_engine.pyx), sus kernels
+# reemplazan a los de Numba: hacen lo mismo, pero compilados de antemano.
+# Además, la extensión registra cada fila de Tape.push en C, sin pasar por
+# el intérprete para cada campo de la fila: es lo que más cuesta al operar
+# con objetos Value escalares.
+try:
+    from michigrad._engine import RowWriter as _RowWriter
+    from michigrad._engine import backward_kernel as _backward_kernel
+    from michigrad._engine import forward_kernel as _forward_kernel
+except ImportError:
+    _RowWriter = None
+
+
+class _RowViews:
+    """
+    Escribe filas nuevas en los arreglos de una cinta (ver Tape.push), igual
+    que el RowWriter de la extensión de Cython, cuando no está compilada.
+
+    Guarda un memoryview sobre cada arreglo: leer o escribir un elemento de
+    un memoryview cuesta bastante menos que hacerlo en un arreglo de NumPy,
+    y lo que se lee son números de Python, con los que las operaciones
+    escalares de _FORWARD también son más rápidas. Hay que crear otro si la
+    cinta reemplaza sus arreglos (al agrandarse o cambiar de precisión).
+    """
+
+    __slots__ = ("a", "args", "b", "c", "data", "depth", "grad", "mask", "op", "param")
+
+    def __init__(self, tape: Tape) -> None:
+        for field in self.__slots__:
+            setattr(self, field, memoryview(getattr(tape, field)))
+
+    def push(
+        self, i: int, o: int, x: int, y: int, z: int, p: float, value: float
+    ) -> None:
+        """
+        Escribe la fila 'i', con la operación 'o', los padres 'x', 'y' y
+        'z' y el parámetro 'p', y calcula su valor y su profundidad. Si la
+        fila es una hoja, su valor es 'value'.
+        """
+        self.op[i] = o
+        self.a[i] = x
+        self.b[i] = y
+        self.c[i] = z
+        self.param[i] = p
+        # No hace falta escribir el gradiente: las filas libres de la cinta
+        # ya lo tienen en cero (ver Tape.reset y Tape._grow).
+        if o == LEAF:
+            self.data[i] = value
+            self.depth[i] = 0
+            return
+        self.data[i] = _FORWARD[o](self, i)
+        depth = self.depth
+        d = depth[x]
+        if y >= 0 and depth[y] > d:
+            d = depth[y]
+        if z >= 0 and depth[z] > d:
+            d = depth[z]
+        depth[i] = 1 + d
+
+
+# Cinta compartida por todos los objetos Value.
+tape = Tape()
+
+_PRECISIONS = {"fp32": np.float32, "fp64": np.float64}
+
+
+def set_precision(precision: str) -> None:
+    """
+    - El argumento 'precision' es "fp64" (el valor por defecto) o "fp32".
+    - Cambia la precisión con la que la cinta guarda los valores, los
+    gradientes y los parámetros de las operaciones.
+
+    Con "fp32" cada fila ocupa la mitad de memoria para esos arreglos, así
+    que el backward pass (que está limitado por el acceso a memoria) mueve
+    la mitad de bytes. A cambio, los resultados pierden precisión: alcanza
+    para entrenar una red, pero no para comparar contra PyTorch en float64.
+    """
+    assert precision in _PRECISIONS, "la precisión debe ser 'fp32' o 'fp64'"
+    tape.set_dtype(_PRECISIONS[precision])
 
 
 class Value:
@@ -10,189 +1190,438 @@ class Value:
     de la red neuronal y soporta operaciones aritméticas
     y funciones matemáticas necesarias para el
     cálculo del forward y backward pass.
+
+    El valor, su gradiente y la operación que lo creó se guardan
+    en una fila de la cinta; el objeto Value solo conoce el índice
+    de esa fila.
+
+    Un objeto Value también puede representar a un arreglo (por ejemplo,
+    los pesos de una capa): sus elementos son filas consecutivas de la
+    cinta, a partir de 'idx', en el orden de NumPy. Las operaciones entre
+    arreglos se hacen elemento a elemento (con broadcasting) y registran
+    todo el bloque de filas de una sola vez.
     """
 
+    # Sin __dict__: cada objeto Value solo guarda su índice, su forma y el
+    # orden topológico cacheado. El nombre vive en la cinta (tape.names) y
+    # solo para los nodos que tienen uno.
+    __slots__ = ("_topo", "idx", "shape")
+
+    # Con esto, en 'np.float32(2) * v' NumPy le cede la operación a
+    # Value.__rmul__ en lugar de intentar convertir a 'v' en un arreglo.
+    __array_ufunc__ = None
+
     def __init__(
         self,
-        data: float,
-        _children: tuple = (),
-        _op: str = "",
+        data: float | np.ndarray = 0.0,
         name: str = "",
+        idx: int | None = None,
+        shape: tuple = (),
     ) -> None:
         """
         - El argumento 'data' es el valor escalar que representa este objeto Value.
             - Puede ser un número entero o un número de punto flotante.
-        - El argumento '_children' es una tupla de objetos Value. Representan
-        a los nodos padres en el grafo.
-        - El argumento '_op' es una cadena que representa la operación que
-        creó a este nodo (+, *, etc). Útil para graphviz.
+            - También puede ser un arreglo de NumPy (o una lista de
+            números): en ese caso, el objeto Value es un arreglo.
         - El argumento 'name' es una cadena que representa el nombre
         de este nodo. Útil para graphviz.
+        - El argumento 'idx' es el índice de una fila ya existente de la
+        cinta. Si se pasa, el objeto Value representa a esa fila y se
+        ignora 'data'; si no, se agrega una hoja nueva a la cinta.
+        - El argumento 'shape' es la forma del arreglo que empieza en la
+        fila 'idx'. Solo se usa junto con 'idx'.
+        """
+        if idx is not None:
+            self.idx, self.shape = idx, shape
+        elif isinstance(data, (list, tuple, np.ndarray)):
+            data = np.asarray(data, dtype=np.float64)
+            self.idx, self.shape = tape.push_leaves(data), data.shape
+        else:
+            self.idx, self.shape = tape.push(data), ()
+
+        # Recorrido del backward pass del grafo que termina en este nodo
+        # (ver Tape.schedule). Se construye en el primer backward pass.
+        self._topo = None
+
+        if name:
+            self.name = name
+
+    @property
+    def size(self) -> int:
+        """
+        La cantidad de elementos (filas de la cinta) de este nodo.
+        """
+        return math.prod(self.shape)
+
+    @property
+    def data(self) -> float | np.ndarray:
+        """
+        El valor del nodo. Si es un arreglo, es una vista sobre la cinta:
+        modificarla modifica el valor del nodo.
+        """
+        if not self.shape:
+            return float(tape.data[self.idx])
+        return tape.data[self.idx : self.idx + self.size].reshape(self.shape)
+
+    @data.setter
+    def data(self, value: float | np.ndarray) -> None:
+        if not self.shape:
+            tape.data[self.idx] = value
+        else:
+            tape.data[self.idx : self.idx + self.size] = np.ravel(value)
+
+    @property
+    def grad(self) -> float | np.ndarray:
+        """
+        El gradiente del nodo. Si es un arreglo, es una vista sobre la cinta,
+        igual que 'data'.
+        """
+        if not self.shape:
+            return float(tape.grad[self.idx])
+        return tape.grad[self.idx : self.idx + self.size].reshape(self.shape)
+
+    @grad.setter
+    def grad(self, value: float | np.ndarray) -> None:
+        if not self.shape:
+            tape.grad[self.idx] = value
+        else:
+            tape.grad[self.idx : self.idx + self.size] = np.ravel(value)
+
+    def rows(self) -> np.ndarray:
+        """
+        Devuelve los índices de las filas de la cinta de este nodo, con la
+        forma del nodo.
+        """
+        return np.arange(self.idx, self.idx + self.size).reshape(self.shape)
+
+    def __len__(self) -> int:
+        if not self.shape:
+            raise TypeError("un escalar no tiene largo")
+        return self.shape[0]
+
+    def __bool__(self) -> bool:
+        """
+        Un objeto Value siempre es verdadero, como cualquier objeto, sea
+        escalar o arreglo. Sin esto, Python usaría __len__, que no está
+        definido para los escalares.
+        """
+        return True
+
+    def __getitem__(self, i: int) -> "Value":
+        """
+        - El argumento 'i' es un índice entero (puede ser negativo).
+        - Devuelve el elemento 'i' del arreglo (o la fila 'i', si tiene más
+        de una dimensión), como un objeto Value que comparte las filas de
+        la cinta con este.
+        """
+        n = len(self)
+        assert -n <= i < n, "índice fuera de rango"
+        inner = self.shape[1:]
+        return Value(idx=self.idx + (i % n) * math.prod(inner), shape=inner)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def name(self) -> str:
+        return tape.names.get(self.idx, "")
+
+    @name.setter
+    def name(self, value: str) -> None:
+        tape.names[self.idx] = value
+
+    @property
+    def _prev(self) -> tuple:
+        """
+        Tupla de nodos padres en el grafo.
+        """
+        return tuple(Value(idx=i) for i in tape.children(self.idx))
+
+    @property
+    def _op(self) -> str:
+        """
+        La operación que creó a este nodo. Útil para graphviz.
+        """
+        op = tape.op[self.idx]
+        if op == POW:
+            return f"**{tape.param[self.idx]:g}"
+        if op == ADD_CONST:
+            return f"+{tape.param[self.idx]:g}"
+        if op == MUL_CONST:
+            return f"*{tape.param[self.idx]:g}"
+        if op == EXP:
+            return f"e^{tape.data[tape.a[self.idx]]}"
+        return _OP_NAMES.get(int(op), "")
+
+    def _unary(self, op: int, param: float = 0.0) -> "Value":
+        """
+        Registra en la cinta una operación con un único padre (self).
+        """
+        if self.shape:
+            idx = tape.push_block(op, self.rows().ravel(), param=param)
+            return Value(idx=idx, shape=self.shape)
+        return _scalar(tape.push(0.0, op, self.idx, -1, param))
+
+    def _binary(self, op: int, other: "Value") -> "Value":
+        """
+        Registra en la cinta una operación con dos padres (self y other).
+        Si alguno es un arreglo, se aplica elemento a elemento, con las
+        reglas de broadcasting de NumPy. Si 'other' no es un objeto Value
+        (por ejemplo, un arreglo de NumPy), se agrega a la cinta como hoja.
         """
-        self.data = data
-        self.grad = 0
-        self.name = name
+        if not isinstance(other, Value):
+            other = Value(other)
+        if not self.shape and not other.shape:
+            return _scalar(tape.push(0.0, op, self.idx, other.idx))
+        shape = np.broadcast_shapes(self.shape, other.shape)
+        a = np.broadcast_to(self.rows(), shape).ravel()
+        b = np.broadcast_to(other.rows(), shape).ravel()
+        return Value(idx=tape.push_block(op, a, b), shape=shape)
 
-        # Función que calcula el gradiente durante el backward pass.
-        self._backward = lambda: None
+    @staticmethod
+    def stack(values: "list[Value]") -> "Value":
+        """
+        - El argumento 'values' es una lista de objetos Value, todos con la
+        misma forma. También puede tener números, que se agregan a la cinta
+        como hojas.
+        - Devuelve un arreglo cuyos elementos son los de 'values'. Si ya
+        ocupan filas consecutivas de la cinta (por ejemplo, porque se
+        crearon uno detrás de otro), el arreglo reutiliza esas filas; si
+        no, se copian a un bloque nuevo.
+        """
+        if not all(isinstance(v, Value) for v in values):
+            if not any(isinstance(v, Value) for v in values):
+                return Value(np.asarray(values, dtype=tape.data.dtype))
+            values = [v if isinstance(v, Value) else Value(v) for v in values]
+        shape = (len(values),) + values[0].shape
+        if not values[0].shape:
+            # Caso común de una lista de escalares: basta con sus índices.
+            rows = np.fromiter(
+                (v.idx for v in values), dtype=np.intp, count=len(values)
+            )
+        else:
+            rows = np.concatenate([v.rows().ravel() for v in values])
+        if np.all(rows[1:] == rows[:-1] + 1):
+            return Value(idx=int(rows[0]), shape=shape)
+        return Value(idx=tape.push_block(ADD_CONST, rows), shape=shape)
+
+    @staticmethod
+    def linear(
+        W: "Value",
+        x: "Value",
+        b: "Value | None" = None,
+        nonlin: str | None = None,
+    ) -> "Value":
+        """
+        - El argumento 'W' es una matriz de forma (nout, nin).
+        - El argumento 'x' es un vector de forma (nin,), o un lote de
+        vectores de forma (..., nin). Puede ser una lista de objetos Value
+        o de números, o un arreglo de NumPy (los números se agregan a la
+        cinta como hojas).
+        - El argumento 'b' es el sesgo, de forma (nout,). Es opcional.
+        - El argumento 'nonlin' es la función de activación que se le
+        aplica al resultado: "relu", "tanh", "sigmoid" o None (ninguna).
+        - Devuelve x @ W.T + b, de forma (..., nout): cada fila de W
+        multiplica (producto escalar) a cada vector de x.
+
+        Cada elemento de la salida es una única fila LINEAR de la cinta,
+        y el valor de todas se calcula con una sola multiplicación de
+        matrices, escrita directamente en las filas reservadas de la cinta,
+        en lugar de un nodo por cada producto y cada suma. La función de
+        activación se aplica en esas mismas filas, sin guardar en la cinta
+        el resultado previo a la activación.
+        """
+        assert nonlin in _LINEAR_NONLIN, f"función de activación desconocida: {nonlin}"
+        if isinstance(x, np.ndarray):
+            x = Value(x)
+        elif isinstance(x, list) or not x.shape:
+            x = Value.stack(x if isinstance(x, list) else [x])
+        nout, nin = W.shape
+        assert x.shape[-1] == nin, f"se esperaban entradas de largo {nin}"
 
-        # Conjunto de nodos padres en el grafo.
-        self._prev = set(_children)
+        batch = x.shape[:-1]
+        nb = math.prod(batch)
+        out = tape.next_rows(nb * nout).reshape(nb, nout)
+        j, s = _block_index(nout, nb)
+        if b is None:
+            bias, c = np.zeros(nout, dtype=tape.data.dtype), -1
+        else:
+            assert b.shape == (nout,), f"se esperaba un sesgo de forma ({nout},)"
+            bias, c = b.data, b.idx + j
+        linear_forward(W.data, bias, x.data.reshape(nb, nin), out)
+        op, activation = _LINEAR_NONLIN[nonlin]
+        activation(out)
+        idx = tape.push_block(op, W.idx + nin * j, x.idx + nin * s, c, nin, out)
+        return Value(idx=idx, shape=batch + (nout,))
 
-        # La operación que creó a este nodo. Útil para graphviz.
-        self._op = _op
+    def __matmul__(self, other: "Value") -> "Value":
+        """
+        - El argumento 'other' es un vector (o una lista de objetos Value).
+        - Define el producto de una matriz (self) por un vector, sin sesgo
+        (ver Value.linear).
+        """
+        return Value.linear(self, other)
 
     def __add__(self, other: "Value") -> "Value":
         """
         - El argumento 'other' es otro objeto Value.
         - Define cómo se suman dos objetos Value:
-            - Se crea un nuevo objeto Value cuyo 'data' es la suma
+            - Se agrega a la cinta un nodo cuyo 'data' es la suma
             de los valores de los dos objetos, y cuyos padres son
             los dos objetos que se están sumando. La operación es "+".
-            - Se define la función _backward para calcular los gradientes
-            durante el backward pass.
+        - Si 'other' es un número, no se lo envuelve en un Value: se
+        registra una suma con una constante, que tiene un único padre
+        y guarda al número como parámetro.
         """
-        other = other if isinstance(other, Value) else Value(other)
-        out = Value(data=self.data + other.data, _children=(self, other), _op="+")
-
-        def _backward() -> None:
-            """
-            Define el backward pass para la suma.
-
-            El gradiente se propaga igual a ambos padres.
-            """
-            self.grad += out.grad
-            other.grad += out.grad
-
-        out._backward = _backward
-
-        return out
+        if not isinstance(other, Value) and isinstance(other, _NUMBER):
+            return self._unary(ADD_CONST, other)
+        return self._binary(ADD, other)
 
     def __mul__(self, other: "Value | float") -> "Value":
         """
         - El argumento 'other' es otro objeto Value.
         - Define cómo se multiplican dos objetos Value:
-            - Se crea un nuevo objeto Value cuyo 'data' es el producto
+            - Se agrega a la cinta un nodo cuyo 'data' es el producto
             de los valores de los dos objetos, y cuyos padres son
             los dos objetos que se están multiplicando. La operación es "*".
-            - Se define la función _backward para calcular los gradientes
-            durante el backward pass.
+        - Si 'other' es un número, se registra una multiplicación por una
+        constante, igual que en la suma.
         """
-        other = other if isinstance(other, Value) else Value(other)
-        out = Value(data=self.data * other.data, _children=(self, other), _op="*")
-
-        def _backward() -> None:
-            """
-            Define el backward pass para la multiplicación.
-
-            Ejemplo: En 6 * 5, la derivada de 6 con respecto a 5 es 6,
-            y la derivada de 5 con respecto a 6 es 5.
-            """
-            self.grad += other.data * out.grad
-            other.grad += self.data * out.grad
-
-        out._backward = _backward
-
-        return out
+        if not isinstance(other, Value) and isinstance(other, _NUMBER):
+            return self._unary(MUL_CONST, other)
+        return self._binary(MUL, other)
 
     def __pow__(self, other: float) -> "Value":
         """
         - El argumento 'other' es un número entero o float.
         - Define cómo se eleva un objeto Value a un entero o float:
-            - Se crea un nuevo objeto Value cuyo 'data' es self.data ** other.
-            La operación es "**".
-            - Se define la función _backward para calcular los gradientes
-            durante el backward pass.
+            - Se agrega a la cinta un nodo cuyo 'data' es self.data ** other.
+            La operación es "**" y el exponente se guarda como parámetro.
         """
-        assert isinstance(other, (int, float)), (
-            "only supporting int/float powers for now"
-        )
-        out = Value(data=self.data**other, _children=(self,), _op=f"**{other}")
-
-        def _backward() -> None:
-            """
-            Define el backward pass para la potenciación.
-            La derivada de x^n es n * x^(n - 1).
-            """
-            self.grad += (other * (self.data ** (other - 1))) * out.grad
-
-        out._backward = _backward
-
-        return out
+        assert isinstance(other, _NUMBER), "only supporting int/float powers for now"
+        return self._unary(POW, other)
 
     def relu(self) -> "Value":
         """
         - Define la función ReLU (Rectified Linear Unit):
-            - Crea un nuevo objeto Value cuyo 'data' es 0 si self.data es
+            - Agrega un nodo cuyo 'data' es 0 si self.data es
             menor a cero, o self.data en caso contrario.
         """
-        out = Value(
-            data=0.0 if self.data < 0 else self.data,
-            _children=(self,),
-            _op="ReLU",
-        )
+        return self._unary(RELU)
 
-        def _backward() -> None:
-            """
-            Define el backward pass para la función ReLU.
-            La derivada de ReLU es 1 si x > 0, y 0 en caso contrario.
-            """
-            self.grad += (out.data > 0) * out.grad
+    def tanh(self) -> "Value":
+        """
+        - Define la función tangente hiperbólica:
+            - Agrega un nodo cuyo 'data' es la tangente
+            hiperbólica de self.data.
+        """
+        return self._unary(TANH)
 
-        out._backward = _backward
+    def sigmoid(self) -> "Value":
+        """
+        - Define la función sigmoide:
+            - Agrega un nodo cuyo 'data' es la función
+            sigmoide de self.data.
+        """
+        return self._unary(SIGMOID)
 
-        return out
+    @staticmethod
+    def affine(w: "Value", x: "Value", b: "Value") -> "Value":
+        """
+        - Los argumentos 'w', 'x' y 'b' son objetos Value o números (que se
+        agregan a la cinta como hojas).
+        - Agrega a la cinta un único nodo cuyo 'data' es w * x + b, en lugar
+        de un nodo para el producto y otro para la suma. Es la operación
+        de cada peso de una neurona.
+        - Si alguno es un arreglo, se aplica elemento a elemento, con las
+        reglas de broadcasting de NumPy, igual que en _binary.
+        """
+        w, x, b = (v if isinstance(v, Value) else Value(v) for v in (w, x, b))
+        if not w.shape and not x.shape and not b.shape:
+            return _scalar(tape.push(0.0, AFFINE, w.idx, x.idx, 0.0, b.idx))
+        shape = np.broadcast_shapes(w.shape, x.shape, b.shape)
+        a, y, c = (np.broadcast_to(v.rows(), shape).ravel() for v in (w, x, b))
+        return Value(idx=tape.push_block(AFFINE, a, y, c), shape=shape)
+
+    @staticmethod
+    def mse(
+        pred: "list[Value] | Value", target: "list | Value | np.ndarray"
+    ) -> "Value":
+        """
+        - El argumento 'pred' es una lista de objetos Value con las
+        predicciones, o un arreglo.
+        - El argumento 'target' es una lista, del mismo largo, con los
+        valores esperados. Pueden ser objetos Value o números. También
+        puede ser un arreglo (un objeto Value o de NumPy), de la misma
+        forma que 'pred' o que se pueda extender a ella con las reglas de
+        broadcasting de NumPy.
+        - Agrega a la cinta un único nodo cuyo 'data' es el error cuadrático
+        medio entre las predicciones y los valores esperados, en lugar de
+        una resta, una potencia y una suma por cada par.
+        """
+        (pred, pshape), (target, tshape) = _rows_of(pred), _rows_of(target)
+        assert len(pred) > 0, "se esperaba al menos una predicción"
+        fits = len(tshape) <= len(pshape) and all(
+            t in (1, p) for t, p in zip(tshape[::-1], pshape[::-1])
+        )
+        assert fits, (
+            f"los valores esperados {tshape} no tienen la forma de las "
+            f"predicciones {pshape}"
+        )
+        target = np.broadcast_to(target.reshape(tshape), pshape).ravel()
+        return Value(idx=tape.push_args(MSE, np.concatenate((pred, target))))
 
     def exp(self) -> "Value":
         """
         - Define la función exponencial:
-            - Crea un nuevo objeto Value cuyo 'data' es e elevado a
+            - Agrega un nodo cuyo 'data' es e elevado a
             self.data.
         """
-        x = self.data
-        out = Value(data=math.exp(x), _children=(self,), _op=f"e^{self.data}")
+        return self._unary(EXP)
 
-        def _backward() -> None:
-            """
-            Define el backward pass para la función exponencial.
-            La derivada de e^x es e^x.
-            """
-            self.grad += out.data * out.grad
-
-        out._backward = _backward
+    def zero_grad(self) -> None:
+        """
+        Reinicia a cero el gradiente de este nodo y de todos los nodos de
+        los que depende, con una única escritura vectorizada sobre la cinta.
+        Los gradientes de otros grafos que compartan la cinta no se tocan.
+        """
+        tape.grad[tape.reachable(self.idx, self.size)] = 0.0
 
-        return out
+    def invalidate_topo(self) -> None:
+        """
+        Descarta el orden topológico guardado, para que se vuelva a
+        construir en el próximo backward pass. Solo hace falta si se
+        reconstruyó el grafo que termina en este nodo.
+        """
+        self._topo = None
 
     def backward(self) -> None:
         """
         Realiza el backward pass, empezando desde el nodo actual
         pasando por todos los nodos padres de él en el grafo.
-        """
-        topo = []
-        visited = set()
-
-        def build_topo(v: Value) -> None:
-            """
-            Construye el orden topológico de todos los nodos en el grafo
-            de forma recursiva.
-            """
-            if v not in visited:
-                visited.add(v)
-                for child in v._prev:
-                    build_topo(child)
-                topo.append(v)
 
-        build_topo(self)
+        El orden topológico se construye una sola vez y se guarda en el
+        nodo, así que llamar varias veces a backward sobre el mismo grafo
+        no lo vuelve a recorrer. Tampoco se recorre si el grafo es idéntico
+        al del último backward pass, como pasa en cada iteración de un
+        bucle de entrenamiento que reinicia la cinta (ver
+        Tape.cached_schedule).
+        """
+        assert not self.shape, "el backward pass se hace desde un escalar"
+        assert self.idx < tape.n, (
+            "el nodo se descartó de la cinta (ver Tape.reset y Module.zero_grad)"
+        )
+        if self._topo is None:
+            self._topo = tape.cached_schedule(self.idx)
 
         # Recorremos los nodos en orden topológico inverso, es decir, primero
         # el nodo final, que en una red neuronal es la función de pérdida,
         # y luego todos los nodos anteriores hasta llegar finalmente a las
         # entradas de la red.
-        # Cada Value tiene su propia función _backward que varía según
-        # qué operación fue la que lo creó.
+        # La cinta elige la función de backward de cada fila según el
+        # código de la operación que la creó.
         self.grad = 1
-        for v in reversed(topo):
-            v._backward()
+        tape.backward(self._topo)
 
     def __neg__(self) -> "Value":  # -self
         """
@@ -209,14 +1638,18 @@ class Value:
     def __sub__(self, other: "Value") -> "Value":  # self - other
         """
         Define la resta entre un objeto Value y otro objeto.
+        Se registra como una única operación "-", sin crear
+        nodos intermedios para la negación.
         """
-        return self + (-other)
+        if not isinstance(other, Value) and isinstance(other, _NUMBER):
+            return self._unary(ADD_CONST, -other)
+        return self._binary(SUB, other)
 
     def __rsub__(self, other: "Value") -> "Value":  # other - self
         """
         Define la resta invertida entre un objeto Value y otro objeto.
         """
-        return other + (-self)
+        return -self + other
 
     def __rmul__(self, other: "Value") -> "Value":  # other * self
         """
@@ -227,17 +1660,200 @@ class Value:
     def __truediv__(self, other: "Value") -> "Value":  # self / other
         """
         Define la división entre un objeto Value y otro.
+        Se registra como una única operación "/", sin crear
+        nodos intermedios para la potencia -1.
         """
-        return self * other**-1
+        if not isinstance(other, Value) and isinstance(other, _NUMBER):
+            return self._unary(MUL_CONST, 1 / other)
+        return self._binary(DIV, other)
 
     def __rtruediv__(self, other: "Value") -> "Value":  # other / self
         """
         Define la división entre un objeto Value y otro.
         """
-        return other * self**-1
+        return self**-1 * other
 
     def __repr__(self) -> str:
         """
         Representación en string del objeto Value.
         """
         return f"Value(data={self.data}, grad={self.grad}, name={self.name})"
+
+
+# Nombres de las operaciones que no dependen de un parámetro. Útil para graphviz.
+_OP_NAMES = {
+    ADD: "+",
+    MUL: "*",
+    RELU: "ReLU",
+    TANH: "tanh",
+    SIGMOID: "sigmoid",
+    SUB: "-",
+    DIV: "/",
+    AFFINE: "affine",
+    MSE: "MSE",
+    LINEAR: "linear",
+    LINEAR_RELU: "linear+ReLU",
+    LINEAR_TANH: "linear+tanh",
+    LINEAR_SIGMOID: "linear+sigmoid",
+}
+
+
+def _sigmoid_inplace(x: np.ndarray) -> np.ndarray:
+    x *= 0.5
+    np.tanh(x, out=x)
+    x += 1.0
+    x *= 0.5
+    return x
+
+
+# Código de operación y función (vectorizada) de cada activación que se
+# puede aplicar en Value.linear. Las funciones modifican el arreglo que
+# reciben, en el lugar.
+_LINEAR_NONLIN = {
+    None: (LINEAR, lambda x: x),
+    "relu": (LINEAR_RELU, lambda x: np.maximum(x, 0.0, out=x)),
+    "tanh": (LINEAR_TANH, lambda x: np.tanh(x, out=x)),
+    "sigmoid": (LINEAR_SIGMOID, _sigmoid_inplace),
+}
+
+
+def _rows_of(values: "list | Value | np.ndarray") -> tuple:
+    """
+    Devuelve los índices de las filas de la cinta de 'values', que puede
+    ser un objeto Value, un arreglo de NumPy o una lista de objetos Value
+    o números, junto con su forma. Los números se agregan a la cinta como
+    hojas.
+    """
+    if isinstance(values, np.ndarray):
+        values = Value(values)
+    if isinstance(values, Value):
+        return values.rows().ravel(), values.shape
+    values = [v if isinstance(v, Value) else Value(v) for v in values]
+    if not values:
+        return np.zeros(0, dtype=np.intp), (0,)
+    rows = np.concatenate([v.rows().ravel() for v in values])
+    return rows, (len(values),) + values[0].shape
+
+
+def _scalar(idx: int) -> Value:
+    """
+    Devuelve el objeto Value escalar de la fila 'idx'. Es lo mismo que
+    Value(idx=idx), sin pasar por los argumentos de Value.__init__: es lo
+    que se crea en cada operación entre escalares.
+    """
+    v = object.__new__(Value)
+    v.idx, v.shape, v._topo = idx, (), None
+    return v
+
+
+class Recording:
+    """
+    Representa a un tramo grabado de la cinta, que puede volver a
+    ejecutarse (forward y backward pass) con nuevos valores en sus hojas
+    sin volver a construir el grafo.
+
+    En un bucle de entrenamiento el grafo tiene siempre la misma forma y
+    solo cambian los datos de entrada, así que alcanza con construirlo
+    una vez.
+    """
+
+    def __init__(self, shape_key=None) -> None:
+        """
+        - El argumento 'shape_key' es cualquier valor que identifique la
+        forma del grafo grabado (por ejemplo, el tamaño de la entrada).
+        Al repetir la grabación hay que pasar el mismo valor: si cambia,
+        el grafo grabado ya no sirve y hay que volver a grabarlo.
+        """
+        self.shape_key = shape_key
+        self.start = self.stop = None
+
+        # Índices de las hojas creadas dentro de la grabación, en el orden
+        # en que se crearon. Son los valores que se cambian al repetirla.
+        self.leaves = None
+
+        # Recorrido del backward pass desde la salida (ver Tape.schedule).
+        self._schedule = None
+
+    def __enter__(self) -> Self:
+        self.start = tape.n
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """
+        Al salir del bloque 'with', el último nodo registrado es la salida
+        de la grabación.
+        """
+        self.stop = tape.n
+        ops = tape.op[self.start : self.stop]
+        self.leaves = self.start + np.flatnonzero(ops == LEAF)
+
+    @property
+    def output(self) -> Value:
+        """
+        El último nodo registrado dentro de la grabación.
+        """
+        return Value(idx=self.stop - 1)
+
+    def replay(self, leaf_values, shape_key=None) -> Value:
+        """
+        - El argumento 'leaf_values' son los nuevos valores de las hojas
+        creadas dentro de la grabación, en el orden en que se crearon.
+        - El argumento 'shape_key' debe coincidir con el de la grabación.
+        - Escribe los nuevos valores en la cinta, recalcula el forward pass
+        del tramo grabado y hace el backward pass desde la salida. Los
+        gradientes de los nodos anteriores a la grabación (por ejemplo, los
+        parámetros) se acumulan, igual que con Value.backward.
+        - Devuelve la salida de la grabación.
+        """
+        assert self.stop is not None, "la grabación todavía no terminó"
+        assert shape_key == self.shape_key, (
+            "cambió la forma del grafo: hay que volver a grabarlo"
+        )
+        assert tape.n >= self.stop, "la cinta se reinició después de grabar"
+        assert len(leaf_values) == len(self.leaves), (
+            f"se esperaban {len(self.leaves)} valores para las hojas"
+        )
+
+        tape.data[self.leaves] = leaf_values
+        tape.forward(self.start, self.stop)
+
+        out = self.output
+        if self._schedule is None:
+            self._schedule = tape.schedule(tape.reachable(out.idx))
+        tape.grad[self.start : self.stop] = 0
+        out.grad = 1
+        tape.backward(self._schedule)
+        return out
+
+
+# Última grabación hecha con record(). Es la que repite replay().
+_recording = None
+
+
+def record(shape_key=None) -> Recording:
+    """
+    - El argumento 'shape_key' identifica la forma del grafo grabado
+    (ver Recording).
+    - Devuelve una grabación para usar en un bloque 'with'. Todo lo que se
+    calcule dentro del bloque queda grabado y puede repetirse con replay().
+
+    Ejemplo:
+        with record():
+            x = [Value(0.0), Value(0.0)]
+            y = Value(0.0)
+            perdida = (modelo(x) - y) ** 2
+        for entrada, salida in datos:
+            modelo.zero_grad()
+            perdida = replay([*entrada, salida])
+    """
+    global _recording
+    _recording = Recording(shape_key)
+    return _recording
+
+
+def replay(leaf_values, shape_key=None) -> Value:
+    """
+    Repite la última grabación hecha con record() (ver Recording.replay).
+    """
+    assert _recording is not None, "no hay ninguna grabación: usar record()"
+    return _recording.replay(leaf_values, shape_key)
@@ -1,6 +1,12 @@
-import random
+import functools
 
-from michigrad.engine import Value
+import numpy as np
+
+from michigrad import backend
+from michigrad.engine import Value, tape
+
+# Nombre de cada función de activación, para la representación en string.
+_NONLIN_NAMES = {"relu": "ReLU", "tanh": "Tanh", "sigmoid": "Sigmoid", None: "Linear"}
 
 
 class Module:
@@ -9,13 +15,61 @@ class Module:
     de la red neuronal (la red misma, las capas, las neuronas) implementan.
     """
 
+    # Sin __dict__: los módulos solo tienen los atributos que declara cada
+    # clase en __slots__, así que no se les pueden agregar otros.
+    __slots__ = ("_params_cache", "_version")
+
+    # Cantidad de filas del principio de la cinta que conserva zero_grad.
+    # También es una sola, como la cinta. Crear parámetros nuevos la vuelve
+    # a None: se calcula en la siguiente llamada a zero_grad.
+    _tape_keep: int | None = None
+
+    def __init__(self) -> None:
+        """
+        La lista de parámetros del módulo se calcula la primera vez que se
+        llama a parameters() y se guarda en '_params_cache', junto con la
+        versión del módulo y la de sus capas, para no volver a armarla en
+        cada iteración de entrenamiento.
+        '_version' cuenta las veces que se reasignó un atributo público de
+        este módulo; cada módulo tiene la suya.
+        """
+        self._version = 0
+        self._params_cache: tuple[tuple, list[Value]] | None = None
+
+    def __setattr__(self, name: str, value) -> None:
+        """
+        Reasignar un atributo público (por ejemplo, las capas de la red o
+        los pesos de una capa) invalida la lista de parámetros guardada de
+        este módulo y la de las redes que lo tienen como capa.
+        """
+        if not name.startswith("_"):
+            self._version += 1
+        object.__setattr__(self, name, value)
+
     def zero_grad(self) -> None:
         """
         Reiniciar los gradientes de todos los parámetros a cero.
-        Se hace antes de hacer backpropagation en cada iteración de entrenamiento.
+        Se hace al principio de cada iteración de entrenamiento, antes del
+        forward pass.
+        Los gradientes de los parámetros que son arreglos son vistas sobre la
+        cinta, así que se llenan con ceros en el lugar, sin crear arreglos
+        nuevos.
+
+        Además, descarta de la cinta el grafo de la iteración anterior (ver
+        Tape.reset): todas las filas registradas después de la primera
+        llamada a zero_grad desde que se crearon los últimos parámetros. Lo
+        que se creó antes (los parámetros, y por ejemplo los datos de
+        entrenamiento) se conserva. Así la cinta no crece de una iteración
+        a otra, y el grafo nuevo ocupa las mismas filas que el anterior.
         """
+        if Module._tape_keep is None or Module._tape_keep > tape.n:
+            Module._tape_keep = tape.n
+        tape.reset(Module._tape_keep)
         for p in self.parameters():
-            p.grad = 0
+            if p.shape:
+                p.grad.fill(0.0)
+            else:
+                p.grad = 0.0
 
     def parameters(self) -> list[Value]:
         """
@@ -24,106 +78,176 @@ class Module:
         """
         return []
 
+    def to(self, device: str) -> "Module":
+        """
+        - El argumento 'device' es "cpu" o "cuda".
+        - Elige el dispositivo en el que se calculan las capas lineales (ver
+        michigrad.backend) y devuelve el mismo módulo. Los parámetros viven
+        en la cinta, que es una sola para todos los módulos, así que el
+        dispositivo también lo es.
+        """
+        backend.set_device(device)
+        return self
+
 
 class Neuron(Module):
     """
     Representa a una neurona de una capa de la red neuronal.
+
+    La neurona no tiene parámetros propios: sus pesos son una fila de la
+    matriz de pesos de una capa, y su sesgo es un elemento del vector de
+    sesgos de esa capa. Ambos son vistas sobre la cinta, así que modificar
+    los de la neurona modifica los de la capa.
     """
 
-    def __init__(self, nin: int, nonlin: bool = True) -> None:
+    __slots__ = ("b", "i", "layer", "w")
+
+    def __init__(
+        self,
+        nin: int,
+        nonlin: bool | str | None = True,
+        layer: "Layer | None" = None,
+        i: int = 0,
+    ) -> None:
         """
         - El argumento 'nin' indica la cantidad de pesos de la neurona.
-        - El argumento 'nonlin' indica si la neurona debe aplicar o no
-        una función de activación no lineal (ReLU) a su salida, una vez
-        la ha calculado como suma ponderada de sus entradas más el sesgo.
+        - El argumento 'nonlin' indica qué función de activación no lineal
+        debe aplicar la neurona a su salida, una vez la ha calculado como
+        suma ponderada de sus entradas más el sesgo (ver Layer).
         - A su vez, la neurona tiene un único sesgo (bias) que se suma a la salida
         lineal antes de aplicar la función de activación (si corresponde).
+        - Los argumentos 'layer' e 'i' indican que la neurona es la neurona
+        'i' de la capa 'layer'. Si no se pasa una capa, se crea una capa
+        nueva de una única neurona.
 
-        Al crearse, la neurona crea 'nin' pesos, inicializados con
-        valores aleatorios entre -1 y 1. Además, inicializa su sesgo en 0.
+        Al crearse la capa, se crean 'nin' pesos por neurona, inicializados
+        con valores aleatorios entre -1 y 1, y los sesgos se inicializan en 0.
         """
-        self.w = [Value(random.uniform(-1, 1)) for _ in range(nin)]
-        self.b = Value(0)
-        self.nonlin = nonlin
+        super().__init__()
+        self.layer = Layer(nin, 1, nonlin=nonlin) if layer is None else layer
+        self.i = i
+        self.w = Value(idx=self.layer.W.idx + i * nin, shape=(nin,))
+        self.b = Value(idx=self.layer.b.idx + i, shape=(1,))
+
+    @property
+    def nonlin(self) -> str | None:
+        return self.layer.nonlin
 
-    def __call__(self, x: list[Value]) -> Value:
+    def __call__(self, x: list[Value] | Value) -> Value:
         """
         - Representa el forward pass de la neurona, es decir, cómo
         calcula su salida a partir de las entradas x.
         - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la neurona.
+        las entradas a la neurona, o un arreglo de objetos Value.
         - La salida de la neurona es un objeto Value que se calcula como
         la suma ponderada de las entradas más el sesgo. Es decir,
         una sumatoria de cada entrada multiplicada por su peso
         correspondiente, y al obtener la suma total, se le suma el sesgo.
-        - Si el atributo 'nonlin' es True, al resultado anterior se le
-        aplica la función de activación ReLU (Rectified Linear Unit). Si es
-        False, simplemente se devuelve el resultado.
+        - Si el atributo 'nonlin' no es None, al resultado anterior se le
+        aplica esa función de activación (por ejemplo, ReLU). Si es None,
+        simplemente se devuelve el resultado.
         """
-        act = sum((wi * xi for wi, xi in zip(self.w, x)), self.b)
-        return act.relu() if self.nonlin else act
+        W = Value(idx=self.w.idx, shape=(1,) + self.w.shape)
+        act = Value.linear(W, x, self.b, self.nonlin)
+        return act[0] if act.shape == (1,) else act
 
     def parameters(self) -> list[Value]:
         """
         Devuelve una lista de objetos Value que representan a
-        todos los parámetros de la neurona: todos sus pesos, y
+        todos los parámetros de la neurona: el arreglo de sus pesos, y
         además el sesgo.
         """
-        return self.w + [self.b]
+        return [self.w, self.b]
 
     def __repr__(self) -> str:
         """
         Representación en string de la neurona.
         """
-        return f"{'ReLU' if self.nonlin else 'Linear'}Neuron({len(self.w)})"
+        return f"{_NONLIN_NAMES[self.nonlin]}Neuron({len(self.w)})"
 
 
 class Layer(Module):
     """
     Representa a una capa de la red neuronal. Puede tener
     una o más neuronas.
+
+    Los pesos de todas las neuronas de la capa se guardan juntos, en una
+    matriz 'W' de forma (nout, nin): la fila 'i' tiene los pesos de la
+    neurona 'i'. Los sesgos se guardan en un vector 'b' de forma (nout,).
     """
 
-    def __init__(self, nin: int, nout: int, **kwargs) -> None:
+    __slots__ = ("W", "b", "nonlin")
+
+    def __init__(
+        self,
+        nin: int,
+        nout: int,
+        nonlin: bool | str | None = True,
+        seed: int | np.random.Generator | None = None,
+    ) -> None:
         """
         - El argumento 'nin' indica la cantidad de pesos que cada
         neurona de la capa debe tener.
         - El argumento 'nout' indica la cantidad de neuronas que
         debe tener la capa.
-        - El argumento '**kwargs' permite pasar argumentos a cada
-        neurona al momento de crearlas. En este caso, el único argumento
-        adicional posible es 'nonlin', que indica si la neurona debe aplicar
-        o no una función de activación no lineal (ReLU) a su salida.
+        - El argumento 'nonlin' indica qué función de activación no lineal
+        deben aplicar las neuronas a su salida: "relu", "tanh", "sigmoid"
+        o None (ninguna). True equivale a "relu" y False a None.
+
+        - El argumento 'seed' es la semilla (o un np.random.Generator) con
+        la que se generan los pesos iniciales. Si es None, cada llamada da
+        pesos distintos.
+        - Los pesos tienen la precisión de la cinta. Como la cinta es una
+        sola, la precisión es la misma para todas las capas: se elige para
+        todo el programa con michigrad.set_precision, antes de crearlas.
 
-        Al crearse, la capa crea 'nout' neuronas, cada una con 'nin' pesos.
+        Al crearse, la capa crea una matriz de 'nout' x 'nin' pesos,
+        inicializados con valores aleatorios entre -1 y 1 (con una única
+        llamada al generador), y 'nout' sesgos inicializados en 0.
         """
-        self.neurons = [Neuron(nin, **kwargs) for _ in range(nout)]
+        super().__init__()
+        self.W = Value(np.random.default_rng(seed).uniform(-1, 1, (nout, nin)))
+        self.b = Value(np.zeros(nout))
+        Module._tape_keep = None
+        self.nonlin = {True: "relu", False: None}.get(nonlin, nonlin)
+        assert self.nonlin in _NONLIN_NAMES, f"activación desconocida: {nonlin}"
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
+    def __call__(self, x: list[Value] | Value | np.ndarray) -> Value:
         """
         - Representa el forward pass de la capa, es decir, cómo
         calcula su salida a partir de las entradas x.
         - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la capa.
-        - La salida de la capa depende de la cantidad de neuronas que tenga:
-          - Si tiene una única neurona, la salida es el resultado de
-            pasarle la lista de entradas 'x' a esa neurona, lo cual es
-            un objeto Value.
-          - Si tiene más de una neurona, la salida es el resultado de
-            pasarle la lista de entradas 'x' a cada una de las
-            neuronas una por una, lo cual es una lista de objetos Value.
-        """
-        out = [n(x) for n in self.neurons]
-        return out[0] if len(out) == 1 else out
+        las entradas a la capa, o un arreglo (un objeto Value o de NumPy).
+            - Si 'x' tiene forma (B, nin), es un lote de B entradas: la capa
+            las procesa todas juntas, con una única multiplicación de
+            matrices, y la salida tiene forma (B, nout).
+        - La salida de cada neurona es la suma ponderada de las entradas
+        más su sesgo, es decir, W @ x + b para todas las neuronas a la vez
+        (ver Value.linear). Si el atributo 'nonlin' no es None, a cada salida
+        se le aplica esa función de activación, en el mismo nodo: la cinta
+        no guarda el resultado previo a la activación.
+        - La salida de la capa es siempre un arreglo de objetos Value, de
+        forma (nout,) o (B, nout), que se puede indexar como una lista.
+        Incluso si tiene una única neurona: así la capa siguiente recibe
+        siempre un arreglo (ver MLP).
+        """
+        return Value.linear(self.W, x, self.b, self.nonlin)
+
+    @property
+    def neurons(self) -> list[Neuron]:
+        """
+        Las neuronas de la capa. Son vistas sobre las filas de 'W' y los
+        elementos de 'b', no copias.
+        """
+        nout, nin = self.W.shape
+        return [Neuron(nin, layer=self, i=i) for i in range(nout)]
 
     def parameters(self) -> list[Value]:
         """
-        Devuelve una lista de objetos Value que representan a
-        todos los parámetros de la capa. Para esto, le pide a cada
-        una de sus neuronas que devuelva SUS parámetros y junta a todos
-        esos parámetros en una única lista.
+        Devuelve una lista con los parámetros de la capa: la
+        matriz de pesos y el vector de sesgos.
         """
-        return [p for n in self.neurons for p in n.parameters()]
+        return [self.W, self.b]
 
     def __repr__(self) -> str:
         """
@@ -132,50 +256,165 @@ class Layer(Module):
         return f"Layer of [{', '.join(str(n) for n in self.neurons)}]"
 
 
+@functools.cache
+def _compile_forward(depth: int):
+    """
+    - El argumento 'depth' es la cantidad de capas de la red.
+    - Devuelve una función forward(x, l0, l1, ...) que aplica las capas
+    en orden, escrita como una línea por capa:
+        def forward(x, l0, l1):
+            x = l0(x)
+            x = l1(x)
+            return x
+    La función se genera una sola vez por cada cantidad de capas, y la
+    comparten todas las redes con esa profundidad.
+    """
+    names = [f"l{i}" for i in range(depth)]
+    lines = [f"def forward(x, {', '.join(names)}):"]
+    lines += [f"    x = {name}(x)" for name in names]
+    lines.append("    return x")
+    namespace = {}
+    # El código se arma solo con los nombres l0, l1, ...: no incluye nada
+    # que venga del usuario, así que exec no ejecuta código ajeno.
+    source = compile("\n".join(lines), f"<MLP forward de {depth} capas>", "exec")
+    exec(source, namespace)  # noqa: S102
+    return namespace["forward"]
+
+
+def _fold_linear(
+    layers: list[Layer], seed: int | np.random.Generator | None = None
+) -> list[Layer]:
+    """
+    - El argumento 'layers' es una lista de capas consecutivas, recién
+    creadas: sus parámetros tienen que ser las últimas filas de la cinta.
+    - El argumento 'seed' es la semilla de las capas nuevas (ver Layer).
+    - Devuelve otra lista de capas que calcula lo mismo, en la que cada
+    capa sin función de activación se junta con la capa siguiente.
+
+    Si la capa 'i' no tiene activación, aplicar la capa 'i' y después la
+    'i + 1' es W2 @ (W1 @ x + b1) + b2 = (W2 @ W1) @ x + (W2 @ b1 + b2),
+    seguido de la activación de la capa 'i + 1': una única capa, con una
+    multiplicación de matrices menos en cada forward pass.
+
+    Si se junta alguna capa, se descartan de la cinta las filas de todas
+    las capas de 'layers' y se crean solo las capas que quedan, para no
+    dejar en la cinta parámetros que ya no usa nadie.
+    """
+    folded, kinds = [], []  # (W, b, nonlin) y clase de cada capa que queda
+    for layer in layers:
+        W, b = layer.W.data.copy(), layer.b.data.copy()
+        if folded and folded[-1][2] is None:
+            W1, b1, _ = folded.pop()
+            W, b = W @ W1, W @ b1 + b
+            kinds.pop()
+        folded.append((W, b, layer.nonlin))
+        kinds.append(type(layer))
+    if len(folded) == len(layers):
+        return layers
+
+    last = layers[-1].b
+    assert last.idx + last.size == tape.n, "las capas tienen que ser las últimas filas"
+    tape.reset(layers[0].W.idx)
+    result = []
+    for (W, b, nonlin), kind in zip(folded, kinds):
+        layer = kind(W.shape[1], W.shape[0], nonlin=nonlin, seed=seed)
+        layer.W.data, layer.b.data = W, b
+        result.append(layer)
+    return result
+
+
 class MLP(Module):
     """
     Representa a una red neuronal que puede tener una o más capas.
     """
 
-    def __init__(self, nin: int, nouts: list[int]) -> None:
+    __slots__ = ("_forward", "_layers")
+
+    def __init__(
+        self,
+        nin: int,
+        nouts: list[int],
+        seed: int | np.random.Generator | None = None,
+        fold: bool = False,
+    ) -> None:
         """
         - El argumento 'nin' indica la cantidad de pesos que debe tener
         cada neurona de la PRIMERA capa de la red.
         - El argumento 'nouts' es una lista de enteros que indica
         la cantidad de neuronas que debe tener cada capa de la red.
-        - La red neuronal tiene una lista de capas.
+        - El argumento 'seed' es la semilla de los pesos iniciales de toda
+        la red: con la misma semilla, la red siempre empieza igual.
+        - El argumento 'fold' indica si las capas sin función de activación
+        se juntan con la capa siguiente, que da el mismo resultado con una
+        capa menos (ver _fold_linear). Con False (el valor por defecto), la
+        red tiene exactamente las capas pedidas en 'nouts'.
+        - La red neuronal tiene una tupla de capas.
+        """
+        super().__init__()
+        rng = np.random.default_rng(seed)
+        layers = self._build_layers([nin] + nouts, rng)
+        self.layers = _fold_linear(layers, seed=rng) if fold else layers
+
+    def _build_layers(self, sz: list[int], rng: np.random.Generator) -> list[Layer]:
+        """
+        - El argumento 'sz' es la cantidad de entradas de la red seguida de
+        la cantidad de neuronas de cada capa.
+        - El argumento 'rng' es el generador de los pesos iniciales.
+        - Devuelve las capas de la red: todas con ReLU, salvo la última.
         """
-        sz = [nin] + nouts
-        self.layers = [
-            Layer(nin=sz[i], nout=sz[i + 1], nonlin=i != len(nouts) - 1)
-            for i in range(len(nouts))
+        n = len(sz) - 1
+        return [
+            Layer(nin=sz[i], nout=sz[i + 1], nonlin=i != n - 1, seed=rng)
+            for i in range(n)
         ]
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
+    def __call__(self, x: list[Value] | Value | np.ndarray) -> Value:
         """
         - Representa el forward pass de la red neuronal, es decir, cómo
         calcula su salida a partir de las entradas x.
         - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la red neuronal.
-        - La salida de la red neuronal depende de la cantidad de capas que tenga:
-          - Si tiene una única capa, la salida es el resultado de pasarle la lista de
-            entradas 'x' a esa capa, lo cual es un objeto Value.
-          - Si tiene más de una capa, la salida es el resultado de pasarle la lista de
-            entradas 'x' a cada una de las capas una por una, lo cual es una lista de
-            objetos Value.
-        """
-        for layer in self.layers:
-            z = layer(x)
-        return z
+        las entradas a la red neuronal, o un arreglo (un objeto Value o de
+        NumPy). Si 'x' es un lote de forma (B, nin), la red procesa las B
+        entradas a la vez y la salida tiene forma (B, nout).
+        - Cada capa recibe como entrada la salida de la capa anterior (la
+        primera recibe 'x'), y la salida de la red es la de la última capa:
+        un objeto Value escalar si tiene una única neurona, o un arreglo
+        si tiene más de una. Las capas siempre devuelven un arreglo; solo
+        la salida final se convierte en escalar.
+        """
+        out = self._forward(x, *self._layers)
+        return out[0] if out.shape == (1,) else out
+
+    @property
+    def layers(self) -> tuple:
+        """
+        Las capas de la red, en una tupla que no cambia. Al asignarlas se
+        elige '_forward': una función que llama a todas las capas una
+        detrás de otra, sin recorrer la tupla en cada forward pass (ver
+        _compile_forward).
+        """
+        return self._layers
+
+    @layers.setter
+    def layers(self, layers) -> None:
+        self._layers = tuple(layers)
+        self._forward = _compile_forward(len(self._layers))
 
     def parameters(self) -> list[Value]:
         """
         Devuelve una lista de objetos Value que representan a
         todos los parámetros de la red neuronal. Para esto, le pide a cada
-        una de sus capas que devuelva SUS parámetros, y junta a todos
-        esos parámetros en una única lista.
+        una de sus capas que devuelva SUS parámetros (su matriz de pesos y
+        su vector de sesgos), y junta a todos esos parámetros en una única lista.
+        La lista se arma una sola vez y se reutiliza en las llamadas siguientes,
+        mientras no se reasigne ningún atributo de la red ni de sus capas.
         """
-        return [p for layer in self.layers for p in layer.parameters()]
+        version = (self._version, *[layer._version for layer in self._layers])
+        cache = self._params_cache
+        if cache is None or cache[0] != version:
+            params = [p for layer in self._layers for p in layer.parameters()]
+            cache = self._params_cache = (version, params)
+        return cache[1]
 
     def __repr__(self) -> str:
         """
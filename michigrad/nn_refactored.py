@@ -1,230 +1,150 @@
-import random
+"""
+Variante de michigrad.nn en la que las capas no aplican una función de
+activación por defecto: se agregan aparte, con las capas ReLU, Tanh y
+Sigmoid. Module, las neuronas, las capas y la red son los de michigrad.nn;
+acá solo cambian los valores por defecto.
+"""
 
-from michigrad.engine_extended import Value
+import numpy as np
 
+from michigrad import nn
+from michigrad.engine import Value
+from michigrad.nn import _NONLIN_NAMES, Module
 
-class Module:
+
+class Neuron(nn.Neuron):
     """
-    Contiene dos métodos que todos los componentes principales
-    de la red neuronal (la red misma, las capas, las neuronas) implementan.
+    Representa a una neurona de una capa de la red neuronal, sin función
+    de activación (ver michigrad.nn.Neuron).
     """
 
-    def zero_grad(self) -> None:
-        """
-        Reiniciar los gradientes de todos los parámetros a cero.
-        Se hace antes de hacer backpropagation en cada iteración de entrenamiento.
-        """
-        for p in self.parameters():
-            p.grad = 0
+    __slots__ = ()
 
-    def parameters(self) -> list[Value]:
+    def __init__(self, nin: int, layer: "Layer | None" = None, i: int = 0) -> None:
         """
-        Devuelve todos los parámetros del módulo, que
-        están representados como objetos Value.
+        - El argumento 'nin' indica la cantidad de pesos de la neurona.
+        - Los argumentos 'layer' e 'i' indican que la neurona es la neurona
+        'i' de la capa 'layer'. Si no se pasa una capa, se crea una capa
+        nueva de una única neurona, sin función de activación.
         """
-        return []
+        super().__init__(nin, layer=Layer(nin, 1) if layer is None else layer, i=i)
 
 
-class Neuron(Module):
+class Activation(Module):
     """
-    Representa a una neurona de una capa de la red neuronal.
+    Representa a una capa de la red neuronal que aplica una función de
+    activación a cada una de sus entradas.
     """
 
-    def __init__(self, nin: int) -> None:
-        """
-        - El argumento 'nin' indica la cantidad de pesos de la neurona.
-        - A su vez, la neurona tiene un único sesgo (bias) que se
-        suma a la salida lineal.
+    __slots__ = ("kind",)
 
-        Al crearse, la neurona crea 'nin' pesos, inicializados con
-        valores aleatorios entre -1 y 1. Además, inicializa su sesgo en 0.
+    def __init__(self, kind: str) -> None:
+        """
+        - El argumento 'kind' indica la función de activación: "relu",
+        "tanh" o "sigmoid". Es el nombre del método de Value que la aplica.
         """
-        self.w = [Value(random.uniform(-1, 1)) for _ in range(nin)]
-        self.b = Value(0)
+        super().__init__()
+        assert kind in _NONLIN_NAMES and kind is not None, (
+            f"activación desconocida: {kind}"
+        )
+        self.kind = kind
 
-    def __call__(self, x: list[Value]) -> Value:
+    def __call__(self, x: list[Value] | Value) -> Value:
         """
-        - Representa el forward pass de la neurona, es decir, cómo
+        - Representa el forward pass de la capa, es decir, cómo
         calcula su salida a partir de las entradas x.
         - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la neurona.
-        - La salida de la neurona es un objeto Value que se calcula como
-        la suma ponderada de las entradas más el sesgo. Es decir,
-        una sumatoria de cada entrada multiplicada por su peso
-        correspondiente, y al obtener la suma total, se le suma el sesgo.
-        """
-        return sum((wi * xi for wi, xi in zip(self.w, x)), self.b)
-
-    def parameters(self) -> list[Value]:
-        """
-        Devuelve una lista de objetos Value que representan a
-        todos los parámetros de la neurona: todos sus pesos, y
-        además el sesgo.
+        las entradas a la capa, o un arreglo de objetos Value.
+        - La salida de la capa es un arreglo de objetos Value, del mismo
+        largo que 'x' aunque tenga un único elemento, donde a cada entrada
+        se le ha aplicado la función de activación. Se aplica a todo el
+        arreglo con una única operación vectorizada, en lugar de un
+        elemento a la vez.
         """
-        return self.w + [self.b]
+        if not isinstance(x, Value):
+            x = Value.stack(x)
+        return getattr(x, self.kind)()
 
     def __repr__(self) -> str:
         """
-        Representación en string de la neurona.
+        Representación en string de la capa.
         """
-        return f"{'Linear'}Neuron({len(self.w)})"
+        return _NONLIN_NAMES[self.kind]
 
 
-class ReLU(Module):
+class ReLU(Activation):
     """
-    Representa a una capa de la red neuronal que aplica la función de activación
-    ReLU a cada una de sus entradas.
+    Capa que aplica la función de activación ReLU a cada una de sus entradas.
     """
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
-        """
-        - Representa el forward pass de la capa, es decir, cómo
-        calcula su salida a partir de las entradas x.
-        - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la capa.
-        - La salida de la capa es una lista de objetos Value, donde
-        a cada entrada se le ha aplicado la función ReLU.
-        """
-        out = [xi.relu() for xi in x]
-        return out[0] if len(out) == 1 else out
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__("relu")
 
 
-class Tanh(Module):
+class Tanh(Activation):
     """
-    Representa a una capa de la red neuronal que aplica la función de activación
-    tangente hiperbólica (tanh) a cada una de sus entradas.
+    Capa que aplica la función de activación tangente hiperbólica (tanh)
+    a cada una de sus entradas.
     """
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
-        """
-        - Representa el forward pass de la capa, es decir, cómo
-        calcula su salida a partir de las entradas x.
-        - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la capa.
-        - La salida de la capa es una lista de objetos Value, donde
-        a cada entrada se le ha aplicado la función tanh.
-        """
-        out = [xi.tanh() for xi in x]
-        return out[0] if len(out) == 1 else out
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__("tanh")
 
 
-class Sigmoid(Module):
+class Sigmoid(Activation):
     """
-    Representa a una capa de la red neuronal que aplica la función de activación
-    sigmoide a cada una de sus entradas.
+    Capa que aplica la función de activación sigmoide a cada una de sus
+    entradas.
     """
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
-        """
-        - Representa el forward pass de la capa, es decir, cómo
-        calcula su salida a partir de las entradas x.
-        - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la capa.
-        - La salida de la capa es una lista de objetos Value, donde
-        a cada entrada se le ha aplicado la función sigmoide.
-        """
-        out = [xi.sigmoid() for xi in x]
-        return out[0] if len(out) == 1 else out
+    __slots__ = ()
 
+    def __init__(self) -> None:
+        super().__init__("sigmoid")
 
-class Layer(Module):
+
+class Layer(nn.Layer):
     """
-    Representa a una capa de la red neuronal. Puede tener
-    una o más neuronas.
+    Representa a una capa de la red neuronal, que por defecto no aplica
+    ninguna función de activación (ver michigrad.nn.Layer).
     """
 
-    def __init__(self, nin: int, nout: int) -> None:
-        """
-        - El argumento 'nin' indica la cantidad de pesos que cada
-        neurona de la capa debe tener.
-        - El argumento 'nout' indica la cantidad de neuronas que
-        debe tener la capa.
-        - El argumento '**kwargs' permite pasar argumentos a cada
-        neurona al momento de crearlas. En este caso, el único argumento
-        adicional posible es 'nonlin', que indica si la neurona debe aplicar
-        o no una función de activación no lineal (ReLU) a su salida.
-
-        Al crearse, la capa crea 'nout' neuronas, cada una con 'nin' pesos.
-        """
-        self.neurons = [Neuron(nin) for _ in range(nout)]
+    __slots__ = ()
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
+    def __init__(
+        self,
+        nin: int,
+        nout: int,
+        nonlin: str | None = None,
+        seed: int | np.random.Generator | None = None,
+    ) -> None:
         """
-        - Representa el forward pass de la capa, es decir, cómo
-        calcula su salida a partir de las entradas x.
-        - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la capa.
-        - La salida de la capa depende de la cantidad de neuronas que tenga:
-          - Si tiene una única neurona, la salida es el resultado de
-            pasarle la lista de entradas 'x' a esa neurona, lo cual es
-            un objeto Value.
-          - Si tiene más de una neurona, la salida es el resultado de
-            pasarle la lista de entradas 'x' a cada una de las
-            neuronas una por una, lo cual es una lista de objetos Value.
+        - Los argumentos 'nin', 'nout' y 'seed' son los de
+        michigrad.nn.Layer.
+        - El argumento 'nonlin' indica qué función de activación aplica la
+        capa a la salida de sus neuronas: "relu", "tanh", "sigmoid" o None
+        (ninguna). Aplicarla acá en vez de con una capa ReLU, Tanh o Sigmoid
+        aparte evita guardar en la cinta la salida previa a la activación.
         """
-        out = [n(x) for n in self.neurons]
-        return out[0] if len(out) == 1 else out
+        assert nonlin in _NONLIN_NAMES, f"activación desconocida: {nonlin}"
+        super().__init__(nin, nout, nonlin, seed)
 
-    def parameters(self) -> list[Value]:
-        """
-        Devuelve una lista de objetos Value que representan a
-        todos los parámetros de la capa. Para esto, le pide a cada
-        una de sus neuronas que devuelva SUS parámetros y junta a todos
-        esos parámetros en una única lista.
-        """
-        return [p for n in self.neurons for p in n.parameters()]
 
-    def __repr__(self) -> str:
-        """
-        Representación en string de la capa.
-        """
-        return f"Layer of [{', '.join(str(n) for n in self.neurons)}]"
-
-
-class MLP(Module):
+class MLP(nn.MLP):
     """
-    Representa a una red neuronal que puede tener una o más capas.
+    Representa a una red neuronal que puede tener una o más capas, todas
+    sin función de activación (ver michigrad.nn.MLP).
     """
 
-    def __init__(self, nin: int, nouts: list[int]) -> None:
-        """
-        - El argumento 'nin' indica la cantidad de pesos que debe tener
-        cada neurona de la PRIMERA capa de la red.
-        - El argumento 'nouts' es una lista de enteros que indica
-        la cantidad de neuronas que debe tener cada capa de la red.
-        - La red neuronal tiene una lista de capas.
-        """
-        sz = [nin] + nouts
-        self.layers = [Layer(nin=sz[i], nout=sz[i + 1]) for i in range(len(nouts))]
+    __slots__ = ()
 
-    def __call__(self, x: list[Value]) -> Value | list[Value]:
-        """
-        - Representa el forward pass de la red neuronal, es decir, cómo
-        calcula su salida a partir de las entradas x.
-        - El argumento 'x' es una lista de objetos Value que representan
-        las entradas a la red neuronal.
-        - La salida de la red neuronal depende de la cantidad de capas que tenga:
-          - Si tiene una única capa, la salida es el resultado de pasarle la lista de
-            entradas 'x' a esa capa, lo cual es un objeto Value.
-          - Si tiene más de una capa, la salida es el resultado de pasarle la lista de
-            entradas 'x' a cada una de las capas una por una, lo cual es una lista de
-            objetos Value.
-        """
-        for layer in self.layers:
-            z = layer(x)
-        return z
-
-    def parameters(self) -> list[Value]:
-        """
-        Devuelve una lista de objetos Value que representan a
-        todos los parámetros de la red neuronal. Para esto, le pide a cada
-        una de sus capas que devuelva SUS parámetros, y junta a todos
-        esos parámetros en una única lista.
-        """
-        return [p for layer in self.layers for p in layer.parameters()]
-
-    def __repr__(self) -> str:
+    def _build_layers(self, sz: list[int], rng: np.random.Generator) -> list[Layer]:
         """
-        Representación en string de la red neuronal.
+        Devuelve las capas de la red (ver michigrad.nn.MLP._build_layers),
+        todas sin función de activación.
         """
-        return f"MLP of [{', '.join(str(layer) for layer in self.layers)}]"
+        return [Layer(nin=sz[i], nout=sz[i + 1], seed=rng) for i in range(len(sz) - 1)]
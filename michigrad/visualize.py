@@ -6,15 +6,18 @@ from pyvis.network import Network
 def show_graph_interactive(self, filename="graph.html"):
     nodes = {}  # Diccionario para almacenar nodos por ID
     edges = []
+    # Los padres están antes en la cinta, así que alcanza con idx + 1 bytes
+    visited = bytearray(self.idx + 1)
 
     def build(v):
-        if id(v) not in nodes:  # Usamos el id del objeto como key
-            nodes[id(v)] = {
+        if not visited[v.idx]:  # Usamos el índice en la cinta como key
+            visited[v.idx] = 1
+            nodes[v.idx] = {
                 "label": f"{v.name} | data={v.data:.2f} | grad={v.grad:.2f}",
                 "shape": "box",
             }
             if v._op:  # Si tiene una operación, crea el nodo de operación
-                op_node_id = f"op_{id(v)}"  # ID unico para el nodo de operacion
+                op_node_id = f"op_{v.idx}"  # ID unico para el nodo de operacion
                 nodes[op_node_id] = {
                     "label": v._op,
                     "shape": "circle",
@@ -23,10 +26,10 @@ def show_graph_interactive(self, filename="graph.html"):
                 }  # Nodo de operacion
                 for child in v._prev:
                     edges.append(
-                        (id(child), op_node_id),
+                        (child.idx, op_node_id),
                     )  # Arista desde los hijos a la operacion
                 edges.append(
-                    (op_node_id, id(v)),
+                    (op_node_id, v.idx),
                 )  # Arista desde la operacion al resultado
                 for child in v._prev:
                     build(child)  # Llamada recursiva para los hijos
@@ -50,13 +53,19 @@ def show_graph_interactive(self, filename="graph.html"):
 
 
 def trace(root):
-    nodes, edges = set(), set()
+    # Los objetos Value son índices a la cinta: dos objetos distintos pueden
+    # representar al mismo nodo, así que se identifican por su índice.
+    # Como los padres siempre están antes en la cinta que sus hijos, los
+    # índices alcanzables desde 'root' entran en un bytearray de root.idx + 1.
+    nodes, edges = {}, set()
+    visited = bytearray(root.idx + 1)
 
     def build(v):
-        if v not in nodes:
-            nodes.add(v)
+        if not visited[v.idx]:
+            visited[v.idx] = 1
+            nodes[v.idx] = v
             for child in v._prev:
-                edges.add((child, v))
+                edges.add((child.idx, v.idx))
                 build(child)
 
     build(root)
@@ -75,17 +84,17 @@ def show_graph(root, format="svg", rankdir="LR"):
         graph_attr={"rankdir": rankdir},
     )  # , node_attr={'rankdir': 'TB'})
 
-    for n in nodes:
+    for n in nodes.values():
         dot.node(
-            name=str(id(n)),
+            name=str(n.idx),
             label="{%s | data %.4f | grad %.4f }" % (n.name, n.data, n.grad),
             shape="record",
         )
         if n._op:
-            dot.node(name=str(id(n)) + n._op, label=n._op)
-            dot.edge(str(id(n)) + n._op, str(id(n)))
+            dot.node(name=str(n.idx) + n._op, label=n._op)
+            dot.edge(str(n.idx) + n._op, str(n.idx))
 
-    for n1, n2 in edges:
-        dot.edge(str(id(n1)), str(id(n2)) + n2._op)
+    for i1, i2 in edges:
+        dot.edge(str(i1), str(i2) + nodes[i2]._op)
 
     return dot
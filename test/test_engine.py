@@ -1,5 +1,19 @@
+import time
+import types
+
+import numpy as np
 import torch
-from michigrad.engine import Value
+from michigrad import backend
+from michigrad._kernels import linear_backward, linear_forward
+from michigrad.engine import (
+    LINEAR,
+    LINEAR_TANH,
+    Value,
+    record,
+    replay,
+    set_precision,
+    tape,
+)
 
 def test_sanity_check():
 
@@ -64,4 +78,402 @@ def test_more_ops():
     assert abs(gmg.data - gpt.data.item()) < tol
     # backward pass went well
     assert abs(amg.grad - apt.grad.item()) < tol
-    assert abs(bmg.grad - bpt.grad.item()) < tol
\ No newline at end of file
+    assert abs(bmg.grad - bpt.grad.item()) < tol
+
+
+def test_numpy_scalars():
+
+    a = Value(1.5)
+    b = a * np.float32(2) + np.int64(3) - np.float64(0.5) / a
+    c = np.float32(2) * b + np.int64(1) - b / np.int32(4) + np.float32(3) / a
+    c.backward()
+    amg, cmg = a, c
+
+    a = torch.Tensor([1.5]).double()
+    a.requires_grad = True
+    b = a * 2 + 3 - 0.5 / a
+    c = 2 * b + 1 - b / 4 + 3 / a
+    c.backward()
+    apt, cpt = a, c
+
+    tol = 1e-6
+    # forward pass went well
+    assert abs(cmg.data - cpt.data.item()) < tol
+    # backward pass went well
+    assert abs(amg.grad - apt.grad.item()) < tol
+
+def test_activations():
+
+    a = Value(-0.5)
+    b = Value(1.5)
+    c = a.tanh() * b.sigmoid() + (a * b).exp() + (b - a).tanh()
+    d = c.sigmoid() + c**2
+    d.backward()
+    amg, bmg, dmg = a, b, d
+
+    a = torch.Tensor([-0.5]).double()
+    b = torch.Tensor([1.5]).double()
+    a.requires_grad = True
+    b.requires_grad = True
+    c = a.tanh() * b.sigmoid() + (a * b).exp() + (b - a).tanh()
+    d = c.sigmoid() + c**2
+    d.backward()
+    apt, bpt, dpt = a, b, d
+
+    tol = 1e-6
+    # forward pass went well
+    assert abs(dmg.data - dpt.data.item()) < tol
+    # backward pass went well
+    assert abs(amg.grad - apt.grad.item()) < tol
+    assert abs(bmg.grad - bpt.grad.item()) < tol
+
+
+def test_fused_ops():
+
+    w = [Value(0.5), Value(-1.5)]
+    x = [Value(2.0), Value(0.25)]
+    b = Value(0.1)
+    h = Value.affine(w[1], x[1], Value.affine(w[0], x[0], b))
+    loss = Value.mse([h, h.tanh()], [1.0, Value(-0.3)])
+    loss.backward()
+    wmg, xmg, bmg, lossmg = w, x, b, loss
+
+    w = torch.Tensor([0.5, -1.5]).double()
+    x = torch.Tensor([2.0, 0.25]).double()
+    b = torch.Tensor([0.1]).double()
+    for t in (w, x, b):
+        t.requires_grad = True
+    h = w[1] * x[1] + (w[0] * x[0] + b)
+    pred = torch.cat([h, h.tanh()])
+    loss = ((pred - torch.Tensor([1.0, -0.3]).double()) ** 2).mean()
+    loss.backward()
+
+    tol = 1e-6
+    # forward pass went well
+    assert abs(lossmg.data - loss.data.item()) < tol
+    # backward pass went well
+    assert abs(bmg.grad - b.grad.item()) < tol
+    for i in range(2):
+        assert abs(wmg[i].grad - w.grad[i].item()) < tol
+        assert abs(xmg[i].grad - x.grad[i].item()) < tol
+
+
+def test_fused_ops_broadcast():
+
+    w = Value(np.array([[0.5], [-1.5]]))
+    x = Value(np.array([2.0, 0.25, -1.0]))
+    h = Value.affine(w, x, 0.1)
+    loss = Value.mse(h, np.array([1.0, 0.0, -1.0]))
+    loss.backward()
+    wmg, xmg, hmg, lossmg = w, x, h, loss
+
+    w = torch.tensor([[0.5], [-1.5]], dtype=torch.float64, requires_grad=True)
+    x = torch.tensor([2.0, 0.25, -1.0], dtype=torch.float64, requires_grad=True)
+    h = w * x + 0.1
+    loss = ((h - torch.tensor([1.0, 0.0, -1.0]).double()) ** 2).mean()
+    loss.backward()
+
+    tol = 1e-6
+    # forward pass went well
+    assert hmg.shape == (2, 3)
+    assert np.abs(hmg.data - h.detach().numpy()).max() < tol
+    assert abs(lossmg.data - loss.data.item()) < tol
+    # backward pass went well
+    assert np.abs(wmg.grad - w.grad.numpy()).max() < tol
+    assert np.abs(xmg.grad - x.grad.numpy()).max() < tol
+    # numbers are wrapped, and mismatched shapes are rejected
+    assert abs(Value.affine(2.0, 3.0, 0.5).data - 6.5) < tol
+    try:
+        Value.mse(Value(np.ones((2, 3))), np.ones((3, 2)))
+    except AssertionError:
+        pass
+    else:
+        assert False, "las formas de mse deberían coincidir"
+
+
+def test_linear():
+
+    W = Value(np.array([[0.5, -1.0], [2.0, 0.25], [-0.3, 0.8]]))
+    x = Value(np.array([[1.0, 2.0], [-0.5, 0.1], [3.0, -1.0], [0.0, 0.7]]))
+    b = Value(np.array([0.1, -0.2, 0.3]))
+    h = Value.linear(W, x, b).tanh()
+    loss = Value.mse(h, np.full((4, 3), 0.5))
+    loss.backward()
+    Wmg, xmg, bmg, lossmg = W, x, b, loss
+
+    W = torch.tensor(W.data, requires_grad=True)
+    x = torch.tensor(x.data, requires_grad=True)
+    b = torch.tensor(b.data, requires_grad=True)
+    h = (x @ W.T + b).tanh()
+    loss = ((h - 0.5) ** 2).mean()
+    loss.backward()
+
+    tol = 1e-6
+    # forward pass went well
+    assert abs(lossmg.data - loss.data.item()) < tol
+    # backward pass went well
+    for vmg, vpt in ((Wmg, W), (xmg, x), (bmg, b)):
+        assert np.abs(vmg.grad - vpt.grad.numpy()).max() < tol
+
+
+def test_linear_activations():
+
+    for nonlin in ("relu", "tanh", "sigmoid"):
+        W = Value(np.array([[0.5, -1.0], [2.0, 0.25], [-0.3, 0.8]]))
+        x = Value(np.array([[1.0, 2.0], [-0.5, 0.1], [3.0, -1.0], [0.0, 0.7]]))
+        b = Value(np.array([0.1, -0.2, 0.3]))
+        h = Value.linear(W, x, b, nonlin)
+        loss = Value.mse(h, np.full((4, 3), 0.5))
+        loss.backward()
+        Wmg, xmg, bmg, lossmg = W, x, b, loss
+
+        W = torch.tensor(W.data, requires_grad=True)
+        x = torch.tensor(x.data, requires_grad=True)
+        b = torch.tensor(b.data, requires_grad=True)
+        h = getattr(torch, nonlin)(x @ W.T + b)
+        loss = ((h - 0.5) ** 2).mean()
+        loss.backward()
+
+        tol = 1e-6
+        # forward pass went well
+        assert abs(lossmg.data - loss.data.item()) < tol
+        # backward pass went well
+        for vmg, vpt in ((Wmg, W), (xmg, x), (bmg, b)):
+            assert np.abs(vmg.grad - vpt.grad.numpy()).max() < tol
+
+
+def test_linear_number_inputs():
+
+    W = Value(np.array([[0.5, -1.0, 2.0], [0.25, -0.3, 0.8]]))
+    a = Value(-1.0)
+    hnum = Value.linear(W, [2.0, 3, -1.0])
+    hmix = Value.linear(W, [2.0, 3, a])
+    loss = Value.mse(hmix, np.zeros(2))
+    loss.backward()
+    Wmg, amg, hnummg, hmixmg = W, a, hnum, hmix
+
+    W = torch.tensor(W.data, requires_grad=True)
+    a = torch.tensor(-1.0, requires_grad=True)
+    x = torch.stack([torch.tensor(2.0), torch.tensor(3.0), a]).double()
+    h = W @ x
+    (h**2).mean().backward()
+
+    tol = 1e-6
+    # forward pass went well
+    assert np.abs(hnummg.data - h.detach().numpy()).max() < tol
+    assert np.abs(hmixmg.data - h.detach().numpy()).max() < tol
+    # backward pass went well
+    assert np.abs(Wmg.grad - W.grad.numpy()).max() < tol
+    assert abs(amg.grad - a.grad.item()) < tol
+
+
+def test_linear_kernels():
+
+    rng = np.random.default_rng(0)
+    W, b, x = rng.normal(size=(5, 4)), rng.normal(size=5), rng.normal(size=(3, 4))
+    dout = rng.normal(size=(3, 5))
+    buf = np.empty((3, 5))
+
+    tol = 1e-12
+    # kernels match the NumPy reference
+    assert np.abs(linear_forward(W, b, x) - (x @ W.T + b)).max() < tol
+    assert linear_forward(W, b, x, buf) is buf
+    assert np.abs(buf - (x @ W.T + b)).max() < tol
+    dW, db, dx = linear_backward(W, x, dout)
+    assert np.abs(dW - dout.T @ x).max() < tol
+    assert np.abs(db - dout.sum(axis=0)).max() < tol
+    assert np.abs(dx - dout @ W).max() < tol
+
+    # a large linear block is back-propagated as one matmul, also when a
+    # row-by-row kernel is available
+    W = Value(rng.normal(size=(64, 32)))
+    x = Value(rng.normal(size=(16, 32)))
+    out = Value.linear(W, x)
+    loss = Value.mse(out, np.zeros((16, 64)))
+    assert LINEAR in [op for op, _ in tape.schedule(tape.reachable(loss.idx))]
+    loss.backward()
+    dout = 2 * out.data / out.size
+    assert np.abs(W.grad - dout.T @ x.data).max() < 1e-9
+    assert np.abs(x.grad - dout @ W.data).max() < 1e-9
+
+
+def test_gpu_backend():
+
+    # a NumPy stand-in for CuPy, so that the GPU path runs on any machine
+    calls = []
+    cupy, min_flops = backend.cupy, backend.CUDA_MIN_FLOPS
+    backend.cupy = types.SimpleNamespace(
+        asarray=np.asarray, asnumpy=lambda a: calls.append(a) or np.asarray(a)
+    )
+    backend.CUDA_MIN_FLOPS = 1
+    try:
+        backend.set_device("cuda")
+        W = Value(np.array([[0.5, -1.0], [2.0, 0.25], [-0.3, 0.8]]))
+        x = Value(np.array([[1.0, 2.0], [-0.5, 0.1], [3.0, -1.0], [0.0, 0.7]]))
+        b = Value(np.array([0.1, -0.2, 0.3]))
+        h = Value.linear(W, x, b, "tanh")
+        loss = Value.mse(h, np.full((4, 3), 0.5))
+        # even a small linear block is left to the device, not the row kernel
+        ops = [op for op, _ in tape.schedule(tape.reachable(loss.idx))]
+        assert LINEAR_TANH in ops
+        loss.backward()
+    finally:
+        backend.set_device("cpu")
+        backend.cupy, backend.CUDA_MIN_FLOPS = cupy, min_flops
+    # one copy back for the forward pass and three for the backward pass
+    assert len(calls) == 4
+    Wmg, xmg, bmg, lossmg = W, x, b, loss
+
+    W = torch.tensor(W.data, requires_grad=True)
+    x = torch.tensor(x.data, requires_grad=True)
+    b = torch.tensor(b.data, requires_grad=True)
+    h = (x @ W.T + b).tanh()
+    loss = ((h - 0.5) ** 2).mean()
+    loss.backward()
+
+    tol = 1e-6
+    # forward pass went well
+    assert abs(lossmg.data - loss.data.item()) < tol
+    # backward pass went well
+    for vmg, vpt in ((Wmg, W), (xmg, x), (bmg, b)):
+        assert np.abs(vmg.grad - vpt.grad.numpy()).max() < tol
+
+
+def test_repeated_backward():
+
+    x = Value(3.0)
+    y = (x * x + x).relu()
+    y.backward()
+    first = x.grad
+
+    # the cached topological order gives the same gradient once cleared
+    y.zero_grad()
+    assert x.grad == 0
+    y.backward()
+    assert first == 7.0
+    assert x.grad == first
+
+
+def test_truthiness():
+
+    # scalars and arrays are always truthy, like any other object
+    assert bool(Value(1.0)) and bool(Value(0.0))
+    assert bool(Value(np.zeros(3)))
+    assert (Value(0.0) or None) is not None
+    # a scalar has no length
+    try:
+        len(Value(1.0))
+    except TypeError:
+        pass
+    else:
+        assert False, "len() de un escalar debería fallar"
+
+
+def test_tape_reset():
+
+    w = Value(2.0)
+    start = tape.n
+    (w * 3.0 - 1.0) ** 2
+    capacity = len(tape.data)
+
+    for _ in range(3 * capacity):
+        tape.reset(start)
+        loss = (w * 3.0 - 1.0) ** 2
+        w.grad = 0
+        loss.backward()
+
+    # the graph rows are reused, so the tape does not keep growing
+    assert len(tape.data) == capacity
+    assert tape.n == start + 3
+    assert w.grad == 30.0
+
+
+def test_cached_schedule():
+
+    x = Value(3.0)
+    start = tape.n
+
+    # same rows and same shape: the previous backward order is reused
+    for _ in range(2):
+        tape.reset(start)
+        y = x * x
+        x.grad = 0
+        y.backward()
+        assert x.grad == 6.0
+
+    # same rows but a different graph: the order is rebuilt
+    tape.reset(start)
+    y = x + 1.0
+    x.grad = 0
+    y.backward()
+    assert x.grad == 1.0
+
+
+def test_record_replay():
+
+    w = Value(0.5)
+    b = Value(-1.0)
+
+    with record(shape_key=2):
+        x = Value(0.0)
+        y = Value(0.0)
+        loss = ((w * x + b).tanh() - y) ** 2
+
+    for xv, yv in [(1.0, 0.2), (-2.0, 0.7), (3.0, -0.4)]:
+        w.grad = b.grad = 0
+        out = replay([xv, yv], shape_key=2)
+        replayed = out.data, w.grad, b.grad
+
+        w.grad = b.grad = 0
+        expected = ((w * xv + b).tanh() - yv) ** 2
+        expected.backward()
+
+        tol = 1e-12
+        assert out.idx == loss.idx
+        for got, want in zip(replayed, (expected.data, w.grad, b.grad)):
+            assert abs(got - want) < tol
+
+
+def test_fp32_precision():
+
+    a = Value(-0.5)
+    b = Value(1.5)
+    set_precision("fp32")
+    try:
+        c = (a * b + b.tanh()).sigmoid() + (a - b).relu() + a.exp()
+        c.backward()
+        assert tape.data.dtype == np.float32
+    finally:
+        set_precision("fp64")
+    amg, bmg, cmg = a, b, c
+
+    a = torch.Tensor([-0.5]).double()
+    b = torch.Tensor([1.5]).double()
+    a.requires_grad = True
+    b.requires_grad = True
+    c = (a * b + b.tanh()).sigmoid() + (a - b).relu() + a.exp()
+    c.backward()
+
+    # float32 only keeps about 7 significant digits
+    tol = 1e-5
+    assert abs(cmg.data - c.data.item()) < tol
+    assert abs(amg.grad - a.grad.item()) < tol
+    assert abs(bmg.grad - b.grad.item()) < tol
+
+
+def test_deep_chain():
+
+    xs = [Value(float(i)) for i in range(64000)]
+    y = xs[0]
+    for x in xs[1:]:
+        y = y * 0.5 + x
+
+    # the graph is walked once, in tape order, whatever its depth
+    start = time.perf_counter()
+    order = tape.reachable(y.idx)
+    assert time.perf_counter() - start < 1.0
+    assert len(order) == y.idx - xs[0].idx + 1
+    assert np.all(order[1:] < order[:-1])
+    y.backward()
+    assert xs[-1].grad == 1.0
+    assert xs[-2].grad == 0.5
@@ -0,0 +1,241 @@
+import numpy as np
+import torch
+
+from michigrad import nn_refactored
+from michigrad.engine import Value, set_precision, tape
+from michigrad.nn import MLP, Layer
+
+
+def test_parameters_cache():
+
+    model = MLP(3, [4, 4, 1], seed=0)
+    assert len(model.parameters()) == 6
+
+    # rebinding the weights of a layer refreshes the cached list
+    W = Value(np.zeros((4, 3)))
+    model.layers[0].W = W
+    assert model.parameters()[0] is W
+    model.zero_grad()
+    model([2.0, 3.0, -1.0]).backward()
+    assert W.grad.shape == (4, 3)
+
+    # and so does rebinding the layers of the network
+    model.layers = model.layers[:2]
+    assert len(model.parameters()) == 4
+    # creating or inspecting other modules keeps the cached list
+    params = model.parameters()
+    Layer(3, 4)
+    repr(model)
+    assert len(model.layers[0].neurons) == 4
+    assert model.parameters() is params
+
+
+def test_zero_grad_reuses_tape():
+
+    x = [2.0, 3.0, -1.0]
+    model = MLP(3, [4, 4, 1], seed=0)
+    target = Value(0.5)
+    sizes = []
+    for _ in range(3):
+        model.zero_grad()
+        loss = (model(x) - target) ** 2
+        loss.backward()
+        sizes.append(tape.n)
+
+    # each iteration discards the previous graph, but keeps the target
+    assert sizes[0] == sizes[1] == sizes[2]
+    assert target.data == 0.5
+    # the graph of the last iteration is gone after zero_grad
+    model.zero_grad()
+    try:
+        loss.backward()
+    except AssertionError:
+        pass
+    else:
+        assert False, "el backward de un nodo descartado debería fallar"
+
+
+def test_fold_linear():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0]])
+    plain = nn_refactored.MLP(3, [4, 4, 2], seed=0)
+    n = tape.n
+    folded = nn_refactored.MLP(3, [4, 4, 2], seed=0, fold=True)
+
+    # the three linear layers collapse into one, without leftover rows
+    assert len(plain.layers) == 3 and len(folded.layers) == 1
+    assert tape.n == n + 3 * 2 + 2
+
+    tol = 1e-9
+    # both networks compute the same function
+    assert np.abs(folded(x).data - plain(x).data).max() < tol
+    # and the seed still fixes the folded network
+    again = nn_refactored.MLP(3, [4, 4, 2], seed=0, fold=True)
+    assert np.array_equal(again.layers[0].W.data, folded.layers[0].W.data)
+
+
+def _torch_mlp(model, x):
+    """Copy the weights of 'model' (nn.MLP) into torch and run it on 'x'."""
+    Ws = [torch.tensor(layer.W.data, requires_grad=True) for layer in model.layers]
+    bs = [torch.tensor(layer.b.data, requires_grad=True) for layer in model.layers]
+    h = torch.tensor(x)
+    for layer, W, b in zip(model.layers, Ws, bs):
+        h = h @ W.T + b
+        if layer.nonlin is not None:
+            h = getattr(torch, layer.nonlin)(h)
+    return h, Ws, bs
+
+
+def test_mlp():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0], [-1.5, 0.3, 0.7]])
+    y = np.array([[1.0], [-1.0], [0.5]])
+    model = MLP(3, [4, 4, 1], seed=0)
+    model.zero_grad()
+    out = model(x)
+    loss = Value.mse(out, y)
+    loss.backward()
+    outmg, lossmg = out, loss
+
+    out, Ws, bs = _torch_mlp(model, x)
+    loss = ((out - torch.tensor(y)) ** 2).mean()
+    loss.backward()
+
+    tol = 1e-6
+    # forward pass went well
+    assert np.abs(outmg.data - out.detach().numpy()).max() < tol
+    assert abs(lossmg.data - loss.data.item()) < tol
+    # backward pass went well
+    for layer, W, b in zip(model.layers, Ws, bs):
+        assert np.abs(layer.W.grad - W.grad.numpy()).max() < tol
+        assert np.abs(layer.b.grad - b.grad.numpy()).max() < tol
+
+
+def test_mlp_batch():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0], [-1.5, 0.3, 0.7]])
+    model = MLP(3, [4, 4, 2], seed=0)
+    batched = model(x)
+
+    tol = 1e-12
+    # a batch gives the same outputs as one sample at a time
+    assert batched.shape == (3, 2)
+    for i in range(3):
+        assert np.abs(model(list(x[i])).data - batched.data[i]).max() < tol
+    # a single output is squeezed to a scalar, a batch of them is not
+    model = MLP(3, [4, 1], seed=0)
+    assert model([2.0, 3.0, -1.0]).shape == ()
+    assert model(x).shape == (3, 1)
+    assert model.layers[-1]([1.0, 2.0, 3.0, 4.0]).shape == (1,)
+
+
+def test_layer_in_place():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0]])
+    layer = Layer(3, 4, seed=0)
+    n = tape.n
+    out = layer(x)
+
+    tol = 1e-12
+    # the matmul is written straight into the rows reserved in the tape
+    assert out.idx == n + x.size and tape.n == out.idx + 2 * 4
+    expected = np.maximum(x @ layer.W.data.T + layer.b.data, 0)
+    assert np.abs(out.data - expected).max() < tol
+    # other batch sizes work the same
+    assert np.abs(layer(x[:1]).data - expected[:1]).max() < tol
+
+
+def test_neurons():
+
+    layer = Layer(3, 4, seed=0)
+    x = [2.0, 3.0, -1.0]
+    out = layer(x)
+
+    tol = 1e-12
+    # each neuron is a view over one row of the layer
+    for i, neuron in enumerate(layer.neurons):
+        assert np.array_equal(neuron.w.data, layer.W.data[i])
+        assert abs(neuron(x).data - out.data[i]) < tol
+    neuron = layer.neurons[1]
+    neuron.w.data = np.zeros(3)
+    assert not layer.W.data[1].any()
+
+
+def test_activation_layers():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0]])
+    for act in (nn_refactored.ReLU, nn_refactored.Tanh, nn_refactored.Sigmoid):
+        layer = nn_refactored.Layer(3, 2, seed=0)
+        out = act()(layer(x))
+        loss = Value.mse(out, np.zeros((2, 2)))
+        loss.backward()
+        Wmg, lossmg = layer.W, loss
+
+        W = torch.tensor(Wmg.data, requires_grad=True)
+        out = getattr(torch, act().kind)(torch.tensor(x) @ W.T)
+        loss = (out**2).mean()
+        loss.backward()
+
+        tol = 1e-6
+        # forward pass went well
+        assert abs(lossmg.data - loss.data.item()) < tol
+        # backward pass went well
+        assert np.abs(Wmg.grad - W.grad.numpy()).max() < tol
+    # a single input still gives an array
+    assert nn_refactored.Tanh()([Value(0.5)]).shape == (1,)
+
+
+def test_mlp_seed():
+
+    a, b, c = MLP(3, [4, 2], seed=7), MLP(3, [4, 2], seed=7), MLP(3, [4, 2], seed=8)
+
+    # the same seed gives the same initial weights, another seed does not
+    for la, lb in zip(a.layers, b.layers):
+        assert np.array_equal(la.W.data, lb.W.data)
+    assert not np.array_equal(a.layers[0].W.data, c.layers[0].W.data)
+    # weights are drawn uniformly in [-1, 1] and biases start at zero
+    for layer in a.layers:
+        assert np.all(np.abs(layer.W.data) <= 1)
+        assert not layer.b.data.any()
+
+
+def test_generated_forward():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0]])
+    model = MLP(3, [4, 4, 4, 2], seed=0)
+    h = x
+    for layer in model.layers:
+        h = layer(h)
+
+    tol = 1e-12
+    # the straight-line forward matches calling the layers in a loop
+    assert np.abs(model(x).data - h.data).max() < tol
+    # and it is shared by every network of the same depth
+    assert MLP(2, [3, 3, 3, 1])._forward is model._forward
+
+
+def test_mlp_fp32():
+
+    x = np.array([[2.0, 3.0, -1.0], [0.5, -0.2, 1.0]])
+    y = np.array([[1.0], [-1.0]])
+    try:
+        set_precision("fp32")
+        model = MLP(3, [4, 4, 1], seed=0)
+        model.zero_grad()
+        loss = Value.mse(model(x), y)
+        loss.backward()
+        assert tape.data.dtype == np.float32
+        assert model.layers[0].W.data.dtype == np.float32
+    finally:
+        set_precision("fp64")
+    lossmg = loss
+
+    out, Ws, _ = _torch_mlp(model, x)
+    loss = ((out - torch.tensor(y)) ** 2).mean()
+    loss.backward()
+
+    # float32 only keeps about 7 significant digits
+    tol = 1e-5
+    assert abs(lossmg.data - loss.data.item()) < tol
+    for layer, W in zip(model.layers, Ws):
+        assert np.abs(layer.W.grad - W.grad.numpy()).max() < tol